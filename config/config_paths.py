@@ -33,10 +33,15 @@ CONFIG_HEALTH_PATH = os.path.join(CONFIG_DIR, "config_health.json")
 CONFIG_SENSOR_ENV_PATH = os.path.join(CONFIG_DIR, "config_sensor_env.json")
 CONFIG_BOOTSTRAP_PATH = os.path.join(CONFIG_DIR, "config_bootstrap.json")
 
+# Journal for write-behind av runtime-data i config_system.json
+CONFIG_SYSTEM_JOURNAL_PATH = os.path.join(CONFIG_DIR, "config_system.journal")
+
 
 # API og datafiler
 ACCESS_TOKENS_PATH = os.path.join(DATA_DIR, "access_tokens.json")
 ACCESS_SESSION_LOG_PATH = os.path.join(DATA_DIR, "access_session_log.json")
+ENV_TIMESERIES_DIR = os.path.join(DATA_DIR, "env_timeseries")   # Binære døgnfiler per miljøsensor
+ENV_ROLLUPS_PATH = os.path.join(DATA_DIR, "env_rollups.json")     # Lukkede time-/døgnaggregater
 
 
 # === Loggfiler ===
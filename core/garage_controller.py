@@ -1,11 +1,17 @@
 import datetime
-import time, json #, threading 
+import threading
+import time
+from collections import namedtuple
 
 #import pigpio
 from datetime import datetime
 
 from config import config_paths as paths
-from utils.relay_control import trigger
+from utils.relay_scheduler import RelayPulseScheduler
+from utils.config_journal import ConfigJournal
+from utils.config_loader import FrozenDict, freeze
+from utils.event_bus import get_event_bus
+from utils.metrics import get_registry
 from utils.logging.unified_logger import get_logger
 # from utils.config_loader import load_config, load_portlogic_config
 # from utils.gpio_initializer import configure_gpio_pins
@@ -21,6 +27,17 @@ except ImportError:
     SensorMonitor = None
 
 
+PORT_STATES = ("open", "closed", "moving", "partial", "sensor_error", "unknown")
+
+# Lesemodell for ruter: uforanderlig per versjon, byttes ut i sin helhet ved hver endring
+PortStateSnapshot = namedtuple("PortStateSnapshot", ["version", "updated", "ports"])
+
+_metrics = get_registry()
+MOVEMENT_SECONDS = _metrics.histogram(
+    "garage_port_movement_seconds", "Varighet av portbevegelse (t2) i sekunder", ("port", "direction")
+)
+
+
 class GarageController:
     def __init__(self, config_gpio, config_system, relay_pins, relay_config, testing_mode=False):
        
@@ -41,6 +58,24 @@ class GarageController:
         self.testing_mode = testing_mode
         self.status = {}
         self._operation_flags = {}
+        self._snapshot = PortStateSnapshot(0, time.time(), FrozenDict())
+        self._snapshot_lock = threading.Lock()     # Kun for skrivere; lesere bruker self._snapshot direkte
+
+        # Statusendringer publiseres til SSE-strømmen (/status/stream)
+        self.status_events = get_event_bus("port_status")
+
+        # Write-behind-persistens for status/timing i config_system.json
+        persistence = config_system.get("persistence", {})
+        self.journal = ConfigJournal(
+            config_path=paths.CONFIG_SYSTEM_PATH,
+            journal_path=paths.CONFIG_SYSTEM_JOURNAL_PATH,
+            document=self.config_system,
+            flush_interval=persistence.get("flush_interval_sec", 1.0),
+            checkpoint_interval=persistence.get("checkpoint_interval_sec", 300),
+        )
+        if self.journal.replay():
+            self.journal.checkpoint()
+        self.journal.start()
 
         # Hent pigpio-instans via delt manager
         self.pi = get_pi()
@@ -49,6 +84,10 @@ class GarageController:
             raise RuntimeError("Feil: pigpio er ikke tilgjengelig")
                 
 
+        # Ikke-blokkerende pulsplanlegger for releene
+        self.relay_scheduler = RelayPulseScheduler(self.pi, relay_pins, relay_config)
+        self.relay_scheduler.start()
+
         self.sensor_monitor = SensorMonitor(
             config_gpio=config_gpio,
             pi=self.pi
@@ -57,6 +96,8 @@ class GarageController:
             self.sensor_monitor.set_callback(self.sensor_event_callback)
 
         self._initialize_port_states()
+        self._publish_snapshot()
+        _metrics.register_collector(self._collect_metrics)
 
 
 
@@ -101,10 +142,9 @@ class GarageController:
 
 
     def save_config(self):
-        """Skriver oppdatert systemkonfig til fil"""
+        """Skriver oppdatert systemkonfig til fil (atomisk sjekkpunkt via journalen)"""
         try:
-            with open(paths.CONFIG_SYSTEM_PATH, "w") as f:
-                json.dump(self.config_system, f, indent=4)
+            self.journal.checkpoint()
         except Exception as e:
             self.logger.error(f"Kunne ikke lagre systemkonfig: {e}")
 
@@ -114,49 +154,71 @@ class GarageController:
 
         self.status_logger.change(f"{port}: {sensor_type} sensor {'aktiv' if is_active else 'inaktiv'}")
 
+        flags = self._operation_flags[port]
         if is_active:
             new_status = "open" if sensor_type == "open" else "closed"
-            self.status[port] = new_status
-
-            if self._operation_flags[port]["moving"]:
-                # Fullfør tidsmåling
-                elapsed = time.time() - self._operation_flags[port]["start_time"]
-                direction = "open" if sensor_type == "open" else "close"
-                self.status[port] = direction  # "open" eller "closed"
-                self.timing_logger.timing(port, direction, elapsed)
-
-                self._operation_flags[port]["moving"] = False
-                self._operation_flags[port]["start_time"] = None
+            self._persist_status(port, new_status)
+            self._set_status(port, new_status)
+
+            if flags["moving"]:
+                # Fullfør tidsmåling: t0 = puls → første sensor slipper, t1 = resten, t2 = totalt
+                start_time = flags["start_time"]
+                if start_time is not None:
+                    elapsed = time.time() - start_time
+                    movement_time = flags.get("movement_detected_time")
+                    t0 = movement_time - start_time if movement_time else None
+                    t1 = elapsed - t0 if t0 is not None else None
+                    direction = "open" if sensor_type == "open" else "close"
+                    try:
+                        MOVEMENT_SECONDS.labels(port=port, direction=direction).observe(elapsed)
+                    except Exception as e:
+                        self.logger.error(f"Kunne ikke registrere bevegelsestid for {port}: {e}")
+                    self._update_timing_data(port, direction, elapsed, t0, t1)
+
+                flags["moving"] = False
+                flags["start_time"] = None
+                flags["movement_detected_time"] = None
         else:
-            self.status[port] = "moving"
+            if flags["moving"] and flags.get("movement_detected_time") is None:
+                flags["movement_detected_time"] = time.time()
+            self._set_status(port, "moving")
+
+        self.status_events.publish("status", {
+            "port": port,
+            "status": self.status[port],
+            "sensor": sensor_type,
+            "active": is_active,
+        })
             
     def open_port(self, port):
         if self.status.get(port) == "open":
             return {"port": port, "status": "already open"}
 
         self.activity_logger.info(f"Åpner port {port}")
-        self.activate_relay(port)
+        command_id = self.activate_relay(port)
         self._operation_flags[port]["moving"] = True
         self._operation_flags[port]["start_time"] = time.time()
+        self._operation_flags[port]["movement_detected_time"] = None
 
         if self.testing_mode:
             self.sensor_event_callback(port, "open", 0)
 
-        return {"port": port, "action": "open initiated"}
+        return {"port": port, "action": "open initiated", "command_id": command_id}
 
     def close_port(self, port):
         if self.status.get(port) == "closed":
             return {"port": port, "status": "already closed"}
 
         self.activity_logger.info(f"Lukker port {port}")
-        self.activate_relay(port)
+        command_id = self.activate_relay(port)
         self._operation_flags[port]["moving"] = True
         self._operation_flags[port]["start_time"] = time.time()
+        self._operation_flags[port]["movement_detected_time"] = None
 
         if self.testing_mode:
             self.sensor_event_callback(port, "closed", 0)
 
-        return {"port": port, "action": "close initiated"}
+        return {"port": port, "action": "close initiated", "command_id": command_id}
 
     def stop_port(self, port):
         if not self._operation_flags[port]["moving"]:
@@ -168,15 +230,15 @@ class GarageController:
     
     def activate_relay(self, port):
         """
-        Wrapper for trigger() med allerede tilgjengelig konfig og pi.
+        Legger en puls i kø hos relay_scheduler og returnerer kommando-ID uten å vente på pulsen.
         """
-        trigger(
-            port=port,
-            pi=self.pi,
-            relay_pins=self.relay_pins,
-            relay_config=self.relay_config,
-            #logger=self.logger
-        )
+        return self.relay_scheduler.pulse(port)
+
+    def get_relay_command(self, command_id):
+        """
+        Returnerer status for en tidligere pulskommando (queued/active/done/failed).
+        """
+        return self.relay_scheduler.get_command(command_id)
 
     def get_current_status(self, port):
         return self.status.get(port, "unknown")
@@ -209,13 +271,15 @@ class GarageController:
     def _update_timing_data(self, port, direction, duration, t0=None, t1=None):
         """
         Oppdaterer timinginformasjon i config_system.json.
+        Verdiene bygges på en kopi og overleveres til journalen (skrives i bakgrunnen).
         """
         try:
-            timing = self.config_system.setdefault(port, {}).setdefault("timing", {})
-            timing_dir = timing.setdefault(direction, {})
+            timing = self.config_system.get(port, {}).get("timing", {})
+            timing_dir = dict(timing.get(direction, {}))
 
             # Oppdater historikk
-            history = timing_dir.setdefault("history", [])
+            history = list(timing_dir.get("history", []))
+            timing_dir["history"] = history
             history.append(round(duration, 2))
             max_history = self.config_gpio.get("timing_config", {}).get("timing_history_size", 3)
             if len(history) > max_history:
@@ -241,15 +305,15 @@ class GarageController:
                 "avg": avg
             })
 
-            self.save_config()
+            self.journal.update((port, "timing", direction), timing_dir)
+            self._publish_snapshot(port)
         except Exception as e:
             self.logger.error(f"Feil i _update_timing_data: {e}")
 
 
 
     def _write_config_to_disk(self):
-        with open(paths.CONFIG_SYSTEM_PATH, "w") as f:
-            json.dump(self.config_system, f, indent=2)
+        self.journal.checkpoint()
 
     def _handle_relay_timeout(self, port):
         flags = self._operation_flags.get(port, {})
@@ -268,69 +332,99 @@ class GarageController:
             self.logger.error(port, f"{port} | bevegelse ikke fullført innen forventet tid | kilde: {source}")
             flags["moving"] = False
 
-    def _sensor_callback(self, gpio, level, tick, port, sensor_type):
-        """
-        Callback-funksjon som trigges når en sensor endrer tilstand.
-        """
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.status_logger.change(f"{port} {sensor_type} sensor endret: level={level} @ {timestamp}")
-
-        if port not in self.status:
-            self.logger.error(f"Ukjent port i callback: {port}")
-            return
-
-        direction = self._operation_flags[port].get("direction")
-        start_time = self._operation_flags[port].get("start_time")
-
-        if not self._operation_flags[port].get("moving"):
-            # Sjekk om begge sensorene er inaktive → mulig port ble flyttet manuelt
-            open_active = self.sensor_monitor.is_sensor_active(port, "open")
-            closed_active = self.sensor_monitor.is_sensor_active(port, "closed")
-            if not open_active and not closed_active:
-                self.status[port] = "partial"
-                self.status_logger.info(f"{port}: Manuell bevegelse? Ingen sensorer aktive.")
-            return
-
-        expected_sensor = "open" if direction == "open" else "closed"
-        opposite_sensor = "closed" if direction == "open" else "open"
-        now = time.time()
-
-        # Registrer t0 dersom dette er første sensor-endring (sensor blir inaktiv)
-        if "movement_detected_time" not in self._operation_flags[port] and sensor_type == opposite_sensor and level == 0:
-            self._operation_flags[port]["movement_detected_time"] = now
-            self.logger.debug(f"{port}: movement_detected_time satt ({sensor_type} = 0)")
-
-        # Dette er "mål-sensoren" – porten ferdig åpnet/lukket
-        if sensor_type == expected_sensor and level == self.sensor_monitor.active_state:
-            movement_time = self._operation_flags[port].get("movement_detected_time")
-            elapsed_total = now - start_time if start_time else None
-            t0 = movement_time - start_time if start_time and movement_time else None
-            t1 = elapsed_total - t0 if elapsed_total and t0 else None
-
-            self._update_timing_data(port, direction, elapsed_total, t0, t1)
-            self.status[port] = direction
-            self.config_system[port]["status"] = direction
-            self.config_system[port]["status_timestamp"] = timestamp
-
-            self._operation_flags[port] = {
-                "moving": False,
-                "start_time": None,
-                "direction": None,
-                "movement_detected_time": None
+    def _persist_status(self, port, status):
+        """Legger status og tidsstempel i journalen (skrives til config_system.json i bakgrunnen)"""
+        try:
+            self.journal.update((port, "status"), status)
+            self.journal.update((port, "status_timestamp"), datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        except Exception as e:
+            self.logger.error(f"Kunne ikke lagre status for {port}: {e}")
+
+    def _set_status(self, port, status):
+        self.status[port] = status
+        self._publish_snapshot(port)
+
+    def _build_port_state(self, port):
+        port_config = self.config_system.get(port)
+        if not isinstance(port_config, dict):
+            port_config = {}
+        timing = {}
+        for direction, data in port_config.get("timing", {}).items():
+            timing[direction] = {
+                "last": data.get("last"),
+                "avg": data.get("avg"),
+                "t0": data.get("t0"),
+                "t1": data.get("t1"),
+                "t2": data.get("t2"),
+                "history": data.get("history", []),
             }
+        return freeze({
+            "status": self.status.get(port, "unknown"),
+            "status_timestamp": port_config.get("status_timestamp"),
+            "timing": timing,
+        })
 
-            self.status_logger.info(f"{port} er nå {direction}")
-            self.save_config()
+    def _publish_snapshot(self, port=None):
+        """
+        Bygger ny versjon av lesemodellen (copy-on-write). Med port bygges bare den porten
+        på nytt; de andre deles med forrige versjon. Uten port bygges alle.
+        """
+        with self._snapshot_lock:
+            previous = self._snapshot
+            if port is None:
+                names = set(self.get_port_names()) | {
+                    name for name, value in self.config_system.items()
+                    if isinstance(value, dict) and "timing" in value
+                }
+                ports = {name: self._build_port_state(name) for name in sorted(names)}
+            else:
+                ports = dict(previous.ports)
+                ports[port] = self._build_port_state(port)
+            self._snapshot = PortStateSnapshot(previous.version + 1, time.time(), FrozenDict(ports))
+
+    def get_state_snapshot(self):
+        """
+        Returnerer gjeldende PortStateSnapshot (version, updated, ports). Snapshotet endres
+        aldri etter publisering, så det kan leses uten lås og uten disk-I/O.
+        """
+        return self._snapshot
 
-        elif sensor_type == opposite_sensor and level == self.sensor_monitor.active_state:
-            self.status[port] = "partial"
-            self._operation_flags[port] = {
-                "moving": False,
-                "start_time": None,
-                "direction": None,
-                "movement_detected_time": None
-            }
-        self.logger.warning(f"{port}: Motsatt sensor aktivert – manuell stopp eller avbrudd")
+    def _collect_metrics(self):
+        """
+        Metrikker for /metrics: portstatus (én serie per mulig tilstand) og relépulser.
+        """
+        relay_stats = self.relay_scheduler.get_stats()
+        return [
+            ("garage_port_state", "gauge", "Nåværende portstatus (1 for aktiv tilstand)", [
+                ({"port": port, "state": state}, 1 if self.status.get(port) == state else 0)
+                for port in self.get_ports() for state in PORT_STATES
+            ]),
+            ("garage_relay_pulses_total", "counter", "Antall fullførte relépulser", [
+                ({"port": port}, count) for port, count in relay_stats["pulse_counts"].items()
+            ]),
+            ("garage_relay_pulses_failed_total", "counter", "Antall relépulser som feilet", [
+                ({}, relay_stats["failed"])
+            ]),
+            ("garage_relay_max_lateness_ms", "gauge", "Største forsinkelse for en planlagt relépuls", [
+                ({}, relay_stats["max_lateness_ms"])
+            ]),
+            ("garage_status_events_total", "counter", "Antall publiserte statushendelser", [
+                ({}, self.status_events.published)
+            ]),
+            ("garage_sensor_edges_total", "counter", "Sensorflanker før og etter debounce", [
+                ({"port": pin["port"], "sensor": pin["sensor"], "result": result}, pin[result])
+                for pin in self.get_sensor_stats().values()
+                for result in ("raw", "accepted", "suppressed")
+            ]),
+        ]
+
+    def get_sensor_stats(self):
+        """
+        Debounce-tellere per sensorpinne (tom dict hvis sensormonitoren ikke støtter det).
+        """
+        if hasattr(self.sensor_monitor, "get_debounce_stats"):
+            return self.sensor_monitor.get_debounce_stats()
+        return {}
 
     def shutdown(self):
         if getattr(self, "_already_shutdown", False):
@@ -338,8 +432,10 @@ class GarageController:
         self._already_shutdown = True
         self.logger.debug("Shutdown pågår – rydder opp rele og sensorer")
         try:
+            self.relay_scheduler.stop()
             if hasattr(self.sensor_monitor, "cleanup"):
                 self.sensor_monitor.cleanup()
+            self.journal.stop()
         except Exception as e:
             self.logger.error("shutdown", f"Feil ved opprydding: {e}")
         else:
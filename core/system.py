@@ -1,55 +1,71 @@
-from utils.logging.unified_logger import get_logger
-from tasks.system_status_reporter import start_system_status_reporter
-
 # core/system.py
 
+"""
+Livssyklus for GarageController.
+
+Import av modulen har ingen sideeffekter. init_system() setter opp GPIO, reléer, pigpio
+og controlleren nøyaktig én gang (kalles av system_init.init()), og logger hvor lang tid
+hvert steg tok. Ruter henter controlleren med get_controller() når de trenger den.
+"""
+
 import atexit
+import threading
+import time
+
 from config import config_paths as paths
 from utils.config_loader import load_config
-from utils.pigpio_manager import get_pi, stop_pi
-from utils.gpio_initializer import initialize_gpio
-from utils.relay_initializer import initialize_relays
-from core.garage_controller import GarageController
+from utils.logging.unified_logger import get_logger
 
 logger = get_logger("system_init", category="system")
 
-
-# Last inn config for sensorer og system
-gpio_config = load_config(paths.CONFIG_GPIO_PATH)
-system_config = load_config(paths.CONFIG_SYSTEM_PATH)
-
-# Sett opp GPIO-modus og pull for sensorer
-initialize_gpio()
-logger.info("GPIO-modus og pull satt opp for sensorer")
-
-# Sett opp reléutganger
-relay_pins, relay_config = initialize_relays()
-logger.info("Reléutganger satt opp")
-# Start delt pigpio-instans
-pi = get_pi()
-logger.info("Delt pigpio-instans startet")
-# Registrer stopp av pigpio-instans ved nedstenging
-atexit.register(stop_pi)
-
-# Start GarageController
-controller = GarageController(
-    config_gpio=gpio_config,
-    config_system=system_config,
-    relay_pins=relay_pins,
-    relay_config=relay_config,
-    testing_mode=False
-)
-logger.info("GarageController initialisert")
-
-start_system_status_reporter()
-logger.info("System status reporter startet")
-
 _controller = None
+_lock = threading.RLock()
+startup_timings = {}        # steg -> millisekunder for siste oppstart
+
 
-def get_controller(config_gpio, config_system, relay_pins, relay_config, testing_mode=False):
+def init_system(config_gpio=None, config_system=None, testing_mode=False):
+    """
+    Initialiserer maskinvare og GarageController. Idempotent: returnerer eksisterende
+    controller hvis den allerede er opprettet.
+    """
     global _controller
-    if _controller is None:
+    with _lock:
+        if _controller is not None:
+            return _controller
+
+        # Tunge importer (pigpio osv.) skjer først her, ikke ved import av modulen
+        from utils.pigpio_manager import get_pi, stop_pi
+        from utils.gpio_initializer import initialize_gpio
+        from utils.relay_initializer import initialize_relays
         from core.garage_controller import GarageController
+        from tasks.system_status_reporter import start_system_status_reporter
+
+        timings = {}
+        started = time.perf_counter()
+        step_started = started
+
+        def _step(name):
+            nonlocal step_started
+            now = time.perf_counter()
+            timings[name] = round((now - step_started) * 1000, 1)
+            step_started = now
+
+        if config_gpio is None:
+            config_gpio = load_config(paths.CONFIG_GPIO_PATH)
+        if config_system is None:
+            config_system = load_config(paths.CONFIG_SYSTEM_PATH)
+        _step("config")
+
+        get_pi()
+        atexit.register(stop_pi)        # Registreres først, kjøres dermed sist ved avslutning
+        _step("pigpio")
+
+        initialize_gpio()
+        _step("gpio")
+
+        relay_pins, relay_config = initialize_relays()
+        _step("relays")
+
         _controller = GarageController(
             config_gpio=config_gpio,
             config_system=config_system,
@@ -57,10 +73,38 @@ def get_controller(config_gpio, config_system, relay_pins, relay_config, testing
             relay_config=relay_config,
             testing_mode=testing_mode,
         )
-    return _controller
+        _step("controller")
+
+        start_system_status_reporter()
+        _step("status_reporter")
+
+        timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+        startup_timings.clear()
+        startup_timings.update(timings)
+        breakdown = ", ".join(f"{name}={ms} ms" for name, ms in timings.items())
+        logger.info(f"GarageController initialisert ({breakdown})")
+        return _controller
+
+
+def get_controller():
+    """
+    Returnerer GarageController-singleton. Initialiseres ved første kall hvis
+    init_system() ikke allerede er kjørt (f.eks. når en rute brukes i et verktøy).
+    """
+    controller = _controller
+    if controller is None:
+        controller = init_system()
+    return controller
+
+
+def is_initialized():
+    return _controller is not None
 
-# Ryddig nedstenging
-def shutdown():
-    controller.shutdown()
 
-atexit.register(shutdown)
+def shutdown_system():
+    """
+    Stopper controlleren hvis den er opprettet (oppretter den aldri).
+    """
+    with _lock:
+        if _controller is not None:
+            _controller.shutdown()
@@ -1,12 +1,12 @@
 # core/system_init.py
 
 import json
-from utils.logging.unified_logger import get_logger
-from core.system import get_controller
+from utils.logging.unified_logger import get_logger, shutdown_logging
+from core.system import init_system, shutdown_system
 from config import config_paths
 from monitor.system_monitor_task import start_system_monitor_task
 from monitor.env_sensor_monitor_task import run_sensor_monitor_loop
-import threading
+from sensors.environment_manager import stop_environment_manager
 import atexit
 
 
@@ -30,19 +30,15 @@ def init():
     try:
         config_gpio = load_json_config(config_paths.CONFIG_GPIO_PATH)
         config_system = load_json_config(config_paths.CONFIG_SYSTEM_PATH)
-        relay_pins = config_gpio.get("relay_pins") or []  # eller bruk riktig nøkkel
-        relay_config = config_gpio.get("relay_config") or {}  # eller bruk riktig nøkkel
         testing_mode = config_system.get("testing_mode", False)
     except Exception as e:
         logger.error(f"Feil ved lasting av konfigurasjon: {e}", exc_info=True)
         raise
 
     try:
-        controller = get_controller(
+        init_system(
             config_gpio=config_gpio,
             config_system=config_system,
-            relay_pins=relay_pins,
-            relay_config=relay_config,
             testing_mode=testing_mode,
         )
         logger.info("GarageController initialisert OK.")
@@ -59,9 +55,9 @@ def init():
         raise
 
     try:
-        logger.info("Starter sensor monitor (bakgrunnstråd)...")
-        threading.Thread(target=run_sensor_monitor_loop, daemon=True).start()
-        logger.info("Sensor monitor tråd startet OK.")
+        logger.info("Starter sensor monitor...")
+        run_sensor_monitor_loop()
+        logger.info("Sensor monitor startet OK.")
     except Exception as e:
         logger.error(f"Feil under oppstart av sensor_monitor_loop: {e}", exc_info=True)
         raise
@@ -78,9 +74,13 @@ def init():
 def shutdown():
     logger.info("=== Starter system shutdown ===")
     try:
-        controller = get_controller(None, None, None, None)  # Henter singleton
-        controller.shutdown()
+        shutdown_system()
         logger.info("GarageController shutdown fullført.")
     except Exception as e:
         logger.error(f"Feil ved GarageController shutdown: {e}", exc_info=True)
-    logger.info("=== System shutdown fullført ===")
\ No newline at end of file
+    try:
+        stop_environment_manager()
+    except Exception as e:
+        logger.error(f"Feil ved stopp av sensormanager: {e}", exc_info=True)
+    logger.info("=== System shutdown fullført ===")
+    shutdown_logging()
\ No newline at end of file
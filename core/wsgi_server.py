@@ -0,0 +1,411 @@
+# core/wsgi_server.py
+
+"""
+Produksjonsserver for Flask-appen basert på Werkzeug sin WSGI-server, men med fast
+trådpool i stedet for én ny tråd per tilkobling.
+
+- threads: antall arbeidertråder (hver behandler én forespørsel om gangen)
+- queue_limit: maks antall forespørsler i kø; er køen full, svares 503 umiddelbart
+- max_idle: maks antall parkerte (inaktive) tilkoblinger; over grensen svares 503
+- keep_alive_timeout: hvor lenge en inaktiv tilkobling får vente på neste forespørsel
+- max_streams: maks antall samtidige SSE-strømmer; over grensen svares 503
+- shutdown_timeout: hvor lenge pågående forespørsler får fullføre ved SIGTERM/SIGINT
+
+Inaktive tilkoblinger (nye tilkoblinger som ennå ikke har sendt noe, og keep-alive mellom
+forespørsler) holder ingen arbeidertråd: de parkeres i en selector og legges i køen først
+når klienten har sendt data. Werkzeug (>= 2.1) svarer med Connection: close, så i praksis
+er det mest nye tilkoblinger som parkeres, men keep-alive håndteres likt om den slås på.
+
+SSE-strømmer (/status/stream, /logs/<type>/follow/stream) kjenner vi igjen på
+Content-Type text/event-stream. Tråden som startet strømmen løsrives fra poolen og
+erstattes av en ny arbeider, så strømmeklienter aldri spiser av kapasiteten for vanlige
+forespørsler. Ved nedstenging lukkes strømmene umiddelbart (klientene kobler seg på igjen).
+
+Alle tråder kjører i samme prosess og deler dermed samme GarageController-singleton.
+"""
+
+import json
+import queue
+import selectors
+import signal
+import socket
+import threading
+import time
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from utils.logging.unified_logger import get_logger
+
+logger = get_logger("wsgi_server", category="system")
+
+DEFAULT_SERVER_CONFIG = {
+    "mode": "production",
+    "host": "0.0.0.0",
+    "port": 5000,
+    "threads": 8,
+    "queue_limit": 32,
+    "keep_alive_timeout": 5,
+    "max_idle": 64,
+    "max_streams": 4,
+    "shutdown_timeout": 10,
+}
+
+_BUSY_BODY = json.dumps({"error": "Serveren er opptatt, prøv igjen"}).encode("utf-8")
+_BUSY_HEADERS = [
+    ("Content-Type", "application/json"),
+    ("Retry-After", "1"),
+    ("Content-Length", str(len(_BUSY_BODY))),
+]
+_BUSY_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    + b"".join(f"{key}: {value}\r\n".encode() for key, value in _BUSY_HEADERS)
+    + b"Connection: close\r\n\r\n" + _BUSY_BODY
+)
+
+# Per arbeidertråd: tilkoblingen som behandles nå, og om tråden er løsrevet til en strøm
+_local = threading.local()
+
+
+class _KeepAliveRequestHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1"       # Nødvendig for keep-alive og chunked SSE
+
+    def handle(self):
+        # Kun én forespørsel per kjøring; serveren parkerer tilkoblingen mellom forespørsler
+        self.serve_once()
+
+    def serve_once(self):
+        _local.handler = self
+        self.close_connection = True
+        try:
+            self.handle_one_request()
+        except (ConnectionError, socket.timeout) as e:
+            self.connection_dropped(e)
+            self.close_connection = True
+        # Strømmer og nedstenging avslutter tilkoblingen etter forespørselen
+        if self.server.draining or getattr(_local, "detached", False):
+            self.close_connection = True
+
+    def finish(self):
+        # En tilkobling som skal parkeres må beholde rfile/wfile til neste forespørsel
+        if self.close_connection:
+            super().finish()
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    multithread = True
+
+    def __init__(self, host, port, app, threads=8, queue_limit=32, keep_alive_timeout=5, max_streams=4,
+                 max_idle=64):
+        handler = type("RequestHandler", (_KeepAliveRequestHandler,), {"timeout": keep_alive_timeout})
+        super().__init__(host, port, app, handler=handler)
+        self.app = self._guard_streams(app)
+        self.draining = False
+        self.rejected = 0
+        self.threads = threads
+        self.capacity = threads + queue_limit     # Forespørsler som behandles eller venter
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_streams = max_streams
+        self.max_idle = max_idle
+        self._queue = queue.Queue()
+        self._pending = 0                         # Aktive + i kø (strømmer telles ikke)
+        self._active = 0
+        self._idle = 0                            # Parkerte tilkoblinger
+        self._streams = set()                     # Handlere med åpen SSE-strøm
+        self._active_cond = threading.Condition()
+        self._worker_seq = 0
+        self._workers = []
+        for _ in range(threads):
+            self._start_worker()
+
+        # Parkerte tilkoblinger overvåkes av én tråd; arbeiderne vekker den via socketpair
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._to_park = queue.SimpleQueue()
+        self._idle_stop = False
+        self._idle_thread = threading.Thread(target=self._idle_loop, name="wsgi_idle", daemon=True)
+        self._idle_thread.start()
+
+    # ---------- Arbeiderpool ----------
+
+    def _start_worker(self):
+        with self._active_cond:
+            self._worker_seq += 1
+            worker = threading.Thread(target=self._worker, name=f"wsgi_worker_{self._worker_seq}", daemon=True)
+            self._workers.append(worker)
+        worker.start()
+
+    def process_request(self, request, client_address):
+        # Kalles fra accept-løkken: parker tilkoblingen til klienten faktisk sender noe
+        if not self._park(request, client_address, None):
+            self._reject(request, client_address, None, "for mange inaktive tilkoblinger")
+
+    def _reject(self, request, client_address, handler, reason):
+        with self._active_cond:
+            self.rejected += 1
+        logger.warning(f"{reason[0].upper()}{reason[1:]} – avviser {client_address[0]} med 503")
+        try:
+            request.sendall(_BUSY_RESPONSE)
+        except OSError:
+            pass
+        if handler is not None:
+            handler.close_connection = True
+            try:
+                handler.finish()
+            except OSError:
+                pass
+        self.shutdown_request(request)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            request, client_address, handler = item
+            _local.handler = None
+            _local.detached = False
+            with self._active_cond:
+                self._active += 1
+            keep = False
+            try:
+                if handler is None:
+                    handler = self.RequestHandlerClass(request, client_address, self)
+                else:
+                    handler.serve_once()
+                    handler.finish()
+                keep = not handler.close_connection
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                if not (keep and self._park(request, client_address, handler)):
+                    if keep:    # max_idle nådd: lukk i stedet for å parkere
+                        handler.close_connection = True
+                        try:
+                            handler.finish()
+                        except OSError:
+                            pass
+                    self.shutdown_request(request)
+                with self._active_cond:
+                    if _local.detached:
+                        self._streams.discard(_local.handler)
+                    else:
+                        self._active -= 1
+                        self._pending -= 1
+                    self._active_cond.notify_all()
+            if _local.detached:
+                return      # Erstattet av en ny arbeider da strømmen startet
+
+    # ---------- SSE-strømmer ----------
+
+    def _guard_streams(self, app):
+        def guarded_app(environ, start_response):
+            rejected = []
+
+            def _start_response(status, headers, exc_info=None):
+                content_type = next((v for k, v in headers if k.lower() == "content-type"), "")
+                if content_type.startswith("text/event-stream") and not self._detach_for_stream():
+                    rejected.append(True)
+                    return start_response("503 SERVICE UNAVAILABLE", list(_BUSY_HEADERS), exc_info)
+                return start_response(status, headers, exc_info)
+
+            app_iter = app(environ, _start_response)
+            if rejected:
+                if hasattr(app_iter, "close"):
+                    app_iter.close()
+                return [_BUSY_BODY]
+            return app_iter
+
+        return guarded_app
+
+    def _detach_for_stream(self):
+        """
+        Løsriver nåværende arbeidertråd fra poolen for resten av strømmen og starter en
+        erstatter. Returnerer False hvis max_streams allerede er nådd.
+        """
+        handler = getattr(_local, "handler", None)
+        if handler is None or _local.detached:
+            return True
+        with self._active_cond:
+            if len(self._streams) >= self.max_streams or self.draining:
+                self.rejected += 1
+                logger.warning(f"Maks antall SSE-strømmer ({self.max_streams}) nådd – svarer 503")
+                return False
+            self._streams.add(handler)
+            self._active -= 1
+            self._pending -= 1
+            self._workers.remove(threading.current_thread())
+            self._active_cond.notify_all()
+        _local.detached = True
+        self._start_worker()
+        return True
+
+    # ---------- Parkerte tilkoblinger ----------
+
+    def _park(self, request, client_address, handler):
+        """Parkerer tilkoblingen. Returnerer False hvis max_idle allerede er nådd."""
+        with self._active_cond:
+            if self._idle >= self.max_idle:
+                return False
+            self._idle += 1
+        self._to_park.put((request, client_address, handler, time.monotonic()))
+        self._wake_idle_loop()
+        return True
+
+    def _wake_idle_loop(self):
+        try:
+            self._wakeup_w.send(b"\0")
+        except OSError:
+            pass    # Bufferen er full – tråden er uansett allerede vekket
+
+    def _idle_loop(self):
+        selector = self._selector
+        while not self._idle_stop:
+            while True:
+                try:
+                    item = self._to_park.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    selector.register(item[0], selectors.EVENT_READ, item)
+                except (ValueError, OSError):
+                    self._close_parked(item)    # Tilkoblingen er allerede lukket
+
+            events = selector.select(timeout=0.5)
+            for key, _ in events:
+                if key.fileobj is self._wakeup_r:
+                    try:
+                        while self._wakeup_r.recv(512):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                selector.unregister(key.fileobj)
+                request, client_address, handler, _ = key.data
+                # Opptak skjer først nå: en parkert tilkobling teller ikke mot køen før den har data
+                with self._active_cond:
+                    self._idle -= 1
+                    admitted = self._pending < self.capacity
+                    if admitted:
+                        self._pending += 1
+                if admitted:
+                    self._queue.put((request, client_address, handler))
+                else:
+                    self._reject(request, client_address, handler, "forespørselskøen er full")
+
+            now = time.monotonic()
+            for key in list(selector.get_map().values()):
+                if key.fileobj is self._wakeup_r:
+                    continue
+                if self.draining or now - key.data[3] >= self.keep_alive_timeout:
+                    selector.unregister(key.fileobj)
+                    self._close_parked(key.data)
+
+        for key in list(selector.get_map().values()):
+            if key.fileobj is not self._wakeup_r:
+                self._close_parked(key.data)
+        selector.close()
+
+    def _close_parked(self, item):
+        request, _, handler, _ = item
+        if handler is not None:
+            handler.close_connection = True
+            try:
+                handler.finish()
+            except OSError:
+                pass
+        self.shutdown_request(request)
+        with self._active_cond:
+            self._idle -= 1
+
+    # ---------- Nedstenging og statistikk ----------
+
+    def drain(self, timeout):
+        """
+        Venter til køen er tom og alle pågående forespørsler er ferdige (maks timeout sekunder).
+        Åpne SSE-strømmer og parkerte tilkoblinger lukkes med en gang.
+        Forutsetter at accept-løkken allerede er stoppet med shutdown().
+        Returnerer True hvis alt ble fullført.
+        """
+        self.draining = True
+        self._wake_idle_loop()
+        with self._active_cond:
+            streams = list(self._streams)
+        for handler in streams:
+            try:
+                handler.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+        deadline = time.monotonic() + timeout
+        with self._active_cond:
+            while self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._active_cond.wait(min(remaining, 0.1))
+            pending = self._pending
+        for _ in range(self.threads):
+            self._queue.put(None)
+        if pending:
+            logger.warning(f"Nedstenging: {pending} forespørsel(er) ble ikke ferdige innen {timeout} s")
+        return not pending
+
+    def server_close(self):
+        super().server_close()
+        self._idle_stop = True
+        self._wake_idle_loop()
+        self._idle_thread.join(timeout=1)
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+    def get_stats(self):
+        return {
+            "threads": self.threads,
+            "active": self._active,
+            "queued": self._pending - self._active,
+            "idle": self._idle,
+            "streams": len(self._streams),
+            "rejected": self.rejected,
+        }
+
+
+def run_server(app, config, on_shutdown=None):
+    """
+    Starter produksjonsserveren og blokkerer til SIGTERM/SIGINT.
+    Ved signal stoppes accept-løkken, pågående forespørsler får fullføre (shutdown_timeout),
+    og deretter kalles on_shutdown (f.eks. system_init.shutdown).
+    """
+    config = {**DEFAULT_SERVER_CONFIG, **(config or {})}
+    server = PooledWSGIServer(
+        config["host"],
+        int(config["port"]),
+        app,
+        threads=int(config["threads"]),
+        queue_limit=int(config["queue_limit"]),
+        keep_alive_timeout=float(config["keep_alive_timeout"]),
+        max_streams=int(config["max_streams"]),
+        max_idle=int(config["max_idle"]),
+    )
+
+    def _on_signal(signum, frame):
+        logger.info(f"Mottok signal {signum} – stopper mottak av nye forespørsler")
+        # shutdown() venter på serve_forever(), så den må kalles fra en annen tråd
+        threading.Thread(target=server.shutdown, name="wsgi_shutdown", daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+
+    logger.info(
+        f"Produksjonsserver lytter på {config['host']}:{config['port']} "
+        f"({config['threads']} tråder, kø {config['queue_limit']}, maks {config['max_streams']} strømmer)"
+    )
+    try:
+        server.serve_forever()
+    finally:
+        server.drain(float(config["shutdown_timeout"]))
+        server.server_close()
+        logger.info("Webserver stoppet")
+        if on_shutdown:
+            on_shutdown()
@@ -14,8 +14,11 @@ def main():
     from flask import Flask
     from utils.logging.unified_logger import get_logger
     from core import system_init
-    from routes.api import api, port_routes, status_routes, config_routes, log_routes, system_routes, sensor_routes, bootstrap_routes
+    from routes.api import api, port_routes, status_routes, config_routes, log_routes, system_routes, sensor_routes, bootstrap_routes, metrics_routes
     from routes.web import web
+    from utils.request_metrics import install_request_metrics
+    from config import config_paths
+    from core.wsgi_server import run_server
 
     logger = get_logger("main", category="system")
     logger.info("=== System oppstart: starter Flask-app og kjører systeminitiering ===")
@@ -28,18 +31,29 @@ def main():
         sys.exit(2)
 
     app = Flask(__name__)
-    app.config["JSONIFY_PRETTYPRINT_REGULAR"] = True
+    app.json.compact = True         # Kompakt JSON også i debug-modus (klientene er maskiner)
+    install_request_metrics(app)
 
     # Registrer API-blueprints
-    for bp in [api, port_routes, status_routes, config_routes, log_routes, system_routes, sensor_routes, bootstrap_routes, web]:
+    for bp in [api, port_routes, status_routes, config_routes, log_routes, system_routes, sensor_routes, bootstrap_routes, metrics_routes, web]:
         app.register_blueprint(bp)
 
     @app.route("/health")
     def health_check():
         return {"status": "ok", "version": "1.0"}
 
-    logger.info("=== Starter Flask web-server ===")
-    app.run(host="0.0.0.0", port=5000, debug=True, use_reloader=False)
+    server_config = system_init.load_json_config(config_paths.CONFIG_SYSTEM_PATH).get("server", {})
+    if server_config.get("mode", "production") == "development":
+        logger.info("=== Starter Flask utviklingsserver ===")
+        app.run(
+            host=server_config.get("host", "0.0.0.0"),
+            port=server_config.get("port", 5000),
+            debug=True,
+            use_reloader=False,
+        )
+    else:
+        logger.info("=== Starter produksjonsserver ===")
+        run_server(app, server_config, on_shutdown=system_init.shutdown)
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,5 @@
 from utils.logging.unified_logger import get_logger
-import time
-# import datetime
-from sensors.environment_manager import EnvironmentSensorManager
+from sensors.environment_manager import get_environment_manager
 from monitor.monitor_registry import register_monitor, update_monitor
 
 
@@ -9,32 +7,24 @@ logger = get_logger("env_sensor_mgmr", category="system")
 env_logger = get_logger("env_sensor_mgmr", category="environment")
 
 
+def _log_readings(readings, ts):
+    for sid, values in readings.items():
+        msg = f"Temp: {values['temperature']}°C, Hum: {values['humidity']}%, Press: {values['pressure']} hPa"
+        env_logger.info(f"{sid}: {msg}")
+
+
+def _heartbeat(readings, ts):
+    update_monitor("env_sensor_monitor")
+
 
 def run_sensor_monitor_loop():
     """
-    Løpende overvåking av sensorer. Leser verdier og logger/lagrer til statusfil.
-    Håndterer dynamisk intervall for hver sensor via EnvironmentSensorManager.
+    Kobler miljøloggen og monitor-registeret til den delte EnvironmentSensorManager.
+    Sensorene leses kun av managerens egen tråd – her registreres bare abonnenter,
+    så funksjonen returnerer umiddelbart.
     """
-    sensor_manager = EnvironmentSensorManager()
-    logger.info("Starter sensor-overvåking...")
-
-    try:
-        while True:
-            readings = sensor_manager.read_all()
-            if readings:
-                sensor_manager.save_latest(readings)
-                for sid, values in readings.items():
-                    msg = f"Temp: {values['temperature']}°C, Hum: {values['humidity']}%, Press: {values['pressure']} hPa"
-                    env_logger.info(f"{sid}: {msg}")
-            time.sleep(5)
-    except KeyboardInterrupt:
-        logger.info("Overvåking avsluttet manuelt")
-    except Exception as e:
-        logger.error(f"Uventet feil: {str(e)}")
-
-def monitor_loop():
     register_monitor("env_sensor_monitor")
-    logger.info("Starter overvåking av miljøsensorer...")
-    while True:
-        update_monitor("env_sensor_monitor")
-        logger.debug("Oppdaterer monitor status")
\ No newline at end of file
+    sensor_manager = get_environment_manager()
+    sensor_manager.subscribe(_heartbeat)
+    sensor_manager.subscribe(_log_readings, requires_logging=True)
+    logger.info("Sensor-overvåking koblet til delt sensormanager")
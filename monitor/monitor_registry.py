@@ -3,14 +3,22 @@
 import threading
 from datetime import datetime
 from utils.logging.unified_logger import get_logger
+from utils.metrics import get_registry
 
 # Global registry og mutex for tråd-sikkerhet
 _monitor_registry = {}
 _registry_lock = threading.Lock()
+_version = 0            # Økes ved hver endring (brukes som ETag for /system/monitors)
 logger = get_logger("monitor_registry", category="system")
 
+def _bump_version():
+    global _version
+    _version += 1
+
+
 def register_monitor(name: str):
     with _registry_lock:
+        _bump_version()
         if name not in _monitor_registry:
             _monitor_registry[name] = {
                 "name": name,
@@ -28,13 +36,20 @@ def update_ping(name: str):
     with _registry_lock:
         if name in _monitor_registry:
             _monitor_registry[name]["last_ping"] = datetime.now()
+            _bump_version()
             logger.debug(f"Ping mottatt fra monitor: {name}")
         else:
             logger.warning(f"Forsøk på ping fra uregistrert monitor: {name}")
 
 def update_monitor(name):
-    if name in _monitor_registry:
-        _monitor_registry[name]["last_updated"] = datetime.utcnow().isoformat() + "Z"
+    with _registry_lock:
+        if name in _monitor_registry:
+            _monitor_registry[name]["last_updated"] = datetime.utcnow().isoformat() + "Z"
+            _bump_version()
+
+
+def get_registry_version():
+    return _version
 
 
 def get_registry_status():
@@ -46,3 +61,26 @@ def get_registry_status():
                 "last_ping": info["last_ping"].isoformat() if info["last_ping"] else None
             } for name, info in _monitor_registry.items()
         }
+
+
+def _collect_metrics():
+    """
+    Metrikker for /metrics: registrerte monitorer og sekunder siden siste oppdatering.
+    """
+    now = datetime.utcnow()
+    with _registry_lock:
+        items = [(name, info["last_updated"]) for name, info in _monitor_registry.items()]
+    ages = []
+    for name, last_updated in items:
+        try:
+            age = (now - datetime.fromisoformat(last_updated.rstrip("Z"))).total_seconds()
+        except (AttributeError, ValueError):
+            age = None
+        ages.append(({"monitor": name}, age))
+    return [
+        ("garage_monitor_registered", "gauge", "Registrerte monitorer", [({"monitor": name}, 1) for name, _ in items]),
+        ("garage_monitor_last_update_age_seconds", "gauge", "Sekunder siden monitoren sist rapporterte", ages),
+    ]
+
+
+get_registry().register_collector(_collect_metrics)
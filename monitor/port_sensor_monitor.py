@@ -1,15 +1,68 @@
 # utils/sensor_monitor.py
 
+import threading
+import time
+
 import pigpio
 from utils.logging.unified_logger import get_logger
 from config.config_paths import CONFIG_GPIO_PATH
 from utils.file_utils import load_json
 
+# Standard debounce: "auto" bruker pigpio sitt glitch-filter hvis det er tilgjengelig,
+# ellers programvarefilter. steady_us er hvor lenge nivået må være stabilt (mikrosekunder).
+DEFAULT_DEBOUNCE = {
+    "mode": "auto",         # auto | glitch | noise | software | none
+    "steady_us": 20000,
+    "noise_active_us": 0,   # Kun for mode "noise" (pigpio set_noise_filter)
+}
+MAX_FILTER_STEADY_US = 300000   # pigpio-grense for glitch/noise-filter
+
+
+class _PinState:
+    """
+    Debounce-tilstand og tellere for én sensorpinne.
+    """
+
+    def __init__(self, gpio, port, sensor_type, config):
+        self.gpio = gpio
+        self.port = port
+        self.sensor_type = sensor_type
+        self.mode = config["mode"]
+        self.steady_us = int(config["steady_us"])
+        self.noise_active_us = int(config.get("noise_active_us", 0))
+        self.level = None               # Siste aksepterte (stabile) nivå
+        self.raw = 0                    # Alle flanker mottatt fra pigpio
+        self.accepted = 0               # Flanker videresendt som logisk overgang
+        self.suppressed = 0             # Flanker filtrert bort som prell
+        self.burst_start_tick = None    # Tick for første flanke i pågående prell
+        self.last_tick = None
+        self.max_burst_us = 0           # Lengste observerte prell (første til siste flanke)
+        self.min_gap_us = None          # Korteste tid mellom to rå flanker
+        self.settle_at = None           # monotonic-frist for ny avlesning (programvarefilter)
+        self.burst_edges = 0
+
+    def get_stats(self):
+        return {
+            "port": self.port,
+            "sensor": self.sensor_type,
+            "gpio": self.gpio,
+            "mode": self.mode,
+            "steady_us": self.steady_us,
+            "level": self.level,
+            "raw": self.raw,
+            "accepted": self.accepted,
+            "suppressed": self.suppressed,
+            "max_burst_us": self.max_burst_us,
+            "min_gap_us": self.min_gap_us,
+        }
+
 
 class SensorMonitor:
     def __init__(self, config_gpio, logger=None, pi=None):
         """
         Overvåker porter og registrerer sensor-endringer via pigpio edge detection.
+        Rå flanker går gjennom et debounce-trinn per pinne før de sendes videre, slik at
+        controlleren får én logisk overgang per fysisk hendelse.
         """
         self.pi = pi  # Delt pigpio-instans (fra pigpio_manager.get_pi())
         
@@ -25,18 +78,35 @@ class SensorMonitor:
 
         self.active_state = self.sensor_config.get("active_state", 1)
         self._gpio_to_port = {}     # GPIO: (portnavn, sensor_type)
+        self._pins = {}             # GPIO: _PinState
         self.callback_function = None
         self.callbacks = []
 
+        # Programvarefilter: én tråd leser pinnen på nytt når nivået har vært stille i steady_us
+        self._cond = threading.Condition()
+        self._settle_thread = None
+        self._stopped = False
+
         self._build_gpio_mapping()
 
     def _build_gpio_mapping(self):
         """
-        Lager oppslagstabell for GPIO → (port, sensor_type)
+        Lager oppslagstabell for GPIO → (port, sensor_type) og debounce-tilstand per pinne.
+        Debounce settes i sensor_config.debounce, med overstyring per pinne under "pins"
+        (nøkkel "port1.open" eller GPIO-nummer).
         """
+        debounce = self.sensor_config.get("debounce", {})
+        overrides = debounce.get("pins", {})
         for port, sensors in self.sensor_pins.items():
             for sensor_type, gpio in sensors.items():
                 self._gpio_to_port[gpio] = (port, sensor_type)
+                pin_config = {
+                    **DEFAULT_DEBOUNCE,
+                    **{key: value for key, value in debounce.items() if key != "pins"},
+                    **overrides.get(str(gpio), {}),
+                    **overrides.get(f"{port}.{sensor_type}", {}),
+                }
+                self._pins[gpio] = _PinState(gpio, port, sensor_type, pin_config)
 
     def set_callback(self, callback_function):
         """
@@ -50,9 +120,14 @@ class SensorMonitor:
         """
         Registrerer pigpio edge detection callbacks for alle sensorer.
         Forutsetter at pinnene er initialisert via gpio_initializer.
+        Registreres bare én gang per instans – nye set_callback()-kall bytter kun funksjonen.
         """
+        if self.callbacks:
+            self.logger.debug("Sensor-callbacks er allerede registrert")
+            return
         for gpio, (port, sensor_type) in self._gpio_to_port.items():
             try:
+                self._setup_debounce(self._pins[gpio])
                 cb = self.pi.callback(
                     gpio,
                     pigpio.EITHER_EDGE,
@@ -63,13 +138,127 @@ class SensorMonitor:
             except Exception as e:
                 self.logger.error(f"Feil ved registrering av callback på GPIO {gpio}: {e}")
 
+        if any(pin.mode == "software" for pin in self._pins.values()):
+            self._settle_thread = threading.Thread(target=self._settle_loop, name="sensor_debounce", daemon=True)
+            self._settle_thread.start()
+
+    def _setup_debounce(self, pin):
+        """
+        Velger filter for pinnen: pigpio glitch/noise-filter i daemonen hvis mulig,
+        ellers programvarefilter. Leser også startnivået.
+        """
+        try:
+            pin.level = self.pi.read(pin.gpio)
+        except Exception as e:
+            self.logger.warning(f"Kunne ikke lese startnivå på GPIO {pin.gpio}: {e}")
+
+        if pin.mode in ("auto", "glitch", "noise"):
+            steady = min(pin.steady_us, MAX_FILTER_STEADY_US)
+            try:
+                if pin.mode == "noise":
+                    result = self.pi.set_noise_filter(pin.gpio, steady, pin.noise_active_us)
+                else:
+                    result = self.pi.set_glitch_filter(pin.gpio, steady)
+                if isinstance(result, int) and result < 0:
+                    raise RuntimeError(f"pigpio-feilkode {result}")
+                pin.mode = "noise" if pin.mode == "noise" else "glitch"
+            except Exception as e:
+                self.logger.warning(
+                    f"Filter i pigpio ikke tilgjengelig for GPIO {pin.gpio} ({e}) – bruker programvarefilter"
+                )
+                pin.mode = "software"
+
+        self.logger.debug(f"Debounce GPIO {pin.gpio} ({pin.port}/{pin.sensor_type}): {pin.mode}, {pin.steady_us} µs")
+
     def _generate_handler(self, gpio):
         """
-        Lager handler som kaller _handle_sensor med korrekt GPIO.
+        Lager handler som kaller _handle_edge med korrekt GPIO og tick.
+        """
+        return lambda gpio, level, tick: self._handle_edge(gpio, level, tick)
+
+    def _handle_edge(self, gpio, level, tick):
+        """
+        Debounce-trinn. Kalles fra pigpio sin callback-tråd for hver rå flanke.
+        - glitch/noise: pigpio har allerede filtrert; bare gjentatt nivå forkastes
+        - software: flanker samles til nivået har vært stille i steady_us; settle-tråden
+          leser da pinnen på nytt og sender én overgang hvis nivået faktisk er endret
+        - none: alle flanker sendes videre
+        """
+        pin = self._pins.get(gpio)
+        if pin is None or level not in (0, 1):
+            # Ukjent GPIO eller watchdog-timeout (level 2)
+            self._handle_sensor(gpio, level, tick)
+            return
+
+        with self._cond:
+            pin.raw += 1
+            if pin.last_tick is not None:
+                gap = pigpio.tickDiff(pin.last_tick, tick)
+                if pin.min_gap_us is None or gap < pin.min_gap_us:
+                    pin.min_gap_us = gap
+                if gap < pin.steady_us and pin.burst_start_tick is not None:
+                    pin.max_burst_us = max(pin.max_burst_us, pigpio.tickDiff(pin.burst_start_tick, tick))
+                else:
+                    pin.burst_start_tick = tick
+            else:
+                pin.burst_start_tick = tick
+            pin.last_tick = tick
+
+            if pin.mode == "software":
+                pin.burst_edges += 1
+                pin.settle_at = time.monotonic() + pin.steady_us / 1e6
+                self._cond.notify()
+                return
+
+            if pin.mode != "none" and level == pin.level:
+                pin.suppressed += 1
+                return
+            pin.level = level
+            pin.accepted += 1
+
+        self._handle_sensor(gpio, level, tick)
+
+    def _settle_loop(self):
         """
-        return lambda gpio, level, tick: self._handle_sensor(gpio, level)
+        Programvarefilter: venter til en pinne har vært stille i steady_us etter siste flanke,
+        leser nivået på nytt og sender overgangen videre bare hvis det er endret.
+        """
+        while True:
+            due = []
+            with self._cond:
+                while not self._stopped:
+                    now = time.monotonic()
+                    deadlines = [pin.settle_at for pin in self._pins.values() if pin.settle_at is not None]
+                    if deadlines and min(deadlines) <= now:
+                        break
+                    self._cond.wait(min(deadlines) - now if deadlines else None)
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                for pin in self._pins.values():
+                    if pin.settle_at is not None and pin.settle_at <= now:
+                        pin.settle_at = None
+                        due.append((pin, pin.burst_edges, pin.last_tick))
+                        pin.burst_edges = 0
+
+            for pin, edges, tick in due:
+                try:
+                    level = self.pi.read(pin.gpio)
+                except Exception as e:
+                    self.logger.error(f"Kunne ikke lese GPIO {pin.gpio} etter debounce: {e}")
+                    continue
+                with self._cond:
+                    changed = level != pin.level
+                    if changed:
+                        pin.level = level
+                        pin.accepted += 1
+                        pin.suppressed += edges - 1
+                    else:
+                        pin.suppressed += edges
+                if changed:
+                    self._handle_sensor(pin.gpio, level, tick)
 
-    def _handle_sensor(self, gpio, level):
+    def _handle_sensor(self, gpio, level, tick=None):
         """
         Behandler sensorendring og videresender til registrert callback.
         """
@@ -80,13 +269,31 @@ class SensorMonitor:
         port, sensor_type = self._gpio_to_port[gpio]
         active_text = "aktiv" if level == self.active_state else "inaktiv"
 
-        self.port_logger.debug(f"Sensor-endring: {port} ({sensor_type}) GPIO {gpio} = {level} → {active_text}")
+        self.port_logger.debug(f"Sensor-endring: {port} ({sensor_type}) GPIO {gpio} = {level} → {active_text} (tick {tick})")
 
         if self.callback_function:
             self.callback_function(port, sensor_type, level)
         else:
             self.logger.warning("Ingen callback-funksjon satt – ignorerer signal")
 
+    def is_sensor_active(self, port, sensor_type):
+        """
+        True hvis sensoren (etter debounce) er i aktiv tilstand.
+        """
+        gpio = self.sensor_pins.get(port, {}).get(sensor_type)
+        pin = self._pins.get(gpio)
+        if pin is None:
+            return False
+        level = pin.level if pin.level is not None else self.pi.read(gpio)
+        return level == self.active_state
+
+    def get_debounce_stats(self):
+        """
+        Tellere per sensorpinne: rå, aksepterte og undertrykte flanker, samt prellmålinger.
+        """
+        with self._cond:
+            return {f"{pin.port}.{pin.sensor_type}": pin.get_stats() for pin in self._pins.values()}
+
     def cleanup(self):
         """
         Stopper alle pigpio callbacks og rydder opp.
@@ -95,4 +302,17 @@ class SensorMonitor:
             cb.cancel()
         self.callbacks.clear()
 
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for pin in self._pins.values():
+            if pin.mode in ("glitch", "noise"):
+                try:
+                    if pin.mode == "noise":
+                        self.pi.set_noise_filter(pin.gpio, 0, 0)
+                    else:
+                        self.pi.set_glitch_filter(pin.gpio, 0)
+                except Exception:
+                    pass
+
         self.logger.debug("Alle sensor-callbacks er deaktivert og fjernet")
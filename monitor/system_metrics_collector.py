@@ -0,0 +1,287 @@
+# monitor/system_metrics_collector.py
+
+"""
+Bakgrunnsinnsamling av systemstatus for Raspberry Pi.
+
+Billige målinger (CPU-temp, load, minne, oppetid) hentes på et kort intervall,
+dyre målinger (diskbruk, apt-oppdateringer) på lange intervaller i en egen tråd,
+slik at et tregt apt-kall aldri forsinker de raske målingene.
+API-et leser siste øyeblikksbilde fra minnet sammen med alderen på dataene.
+
+Utvalgte verdier lagres i tillegg i ringbuffere (array) med fast størrelse for de siste
+24 timene, slik at trender kan vises uten å lese logger.
+"""
+
+import bisect
+import math
+import threading
+import time
+from array import array
+from datetime import datetime
+
+from config import config_paths as paths
+from utils.config_loader import get_config
+from utils.logging.unified_logger import get_logger
+from utils.metrics import get_registry
+from utils.system_monitor import (
+    get_system_time, get_uptime, get_app_uptime, get_cpu_temperature,
+    get_cpu_load, get_memory_usage, get_disk_usage, get_pending_updates,
+)
+
+logger = get_logger("system_metrics", category="system", source="health")
+
+DEFAULT_COLLECTOR_CONFIG = {
+    "fast_interval_sec": 10,
+    "disk_interval_sec": 300,
+    "updates_interval_sec": 21600,
+    "history_resolution_sec": 60,
+    "history_hours": 24,
+}
+
+# Metrikker i historikken: navn -> (seksjon, nøkkel) i statusdict
+HISTORY_METRICS = {
+    "cpu_temp": ("cpu", "cpu_temp_c"),
+    "load_1min": ("cpu", "load_1min"),
+    "memory_percent": ("memory", "percent_used_mem"),
+    "disk_percent": ("disk", "percent_used"),
+}
+
+
+class MetricsHistory:
+    """
+    Ringbuffer med fast kapasitet: tidspunkter i array('d'), hver metrikk i array('f').
+    Manglende verdier lagres som NaN.
+    """
+
+    def __init__(self, capacity, metrics):
+        self.capacity = capacity
+        self.metrics = tuple(metrics)
+        self._timestamps = array("d", [0.0]) * capacity
+        self._values = {name: array("f", [math.nan]) * capacity for name in self.metrics}
+        self._head = 0          # Neste posisjon som skrives
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def append(self, ts, values):
+        with self._lock:
+            self._timestamps[self._head] = ts
+            for name in self.metrics:
+                value = values.get(name)
+                self._values[name][self._head] = math.nan if value is None else value
+            self._head = (self._head + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def _ordered(self, buf):
+        # Eldste først
+        if self._count < self.capacity:
+            return buf[:self._count]
+        return buf[self._head:] + buf[:self._head]
+
+    def query(self, points=None, metrics=None, since=None):
+        """
+        Returnerer {"timestamps": [...], metrikk: [...]} eldste først.
+        Med points slås nabopunkter sammen (snitt, NaN ignoreres) til maks points verdier.
+        """
+        metrics = [name for name in (metrics or self.metrics) if name in self._values]
+        with self._lock:
+            timestamps = self._ordered(self._timestamps)
+            series = {name: self._ordered(self._values[name]) for name in metrics}
+
+        start = bisect.bisect_left(timestamps, since) if since is not None else 0
+        count = len(timestamps) - start
+        points = min(points or count, count)
+
+        result = {"timestamps": [], **{name: [] for name in metrics}}
+        for i in range(points):
+            lo = start + i * count // points
+            hi = start + (i + 1) * count // points
+            result["timestamps"].append(round(timestamps[hi - 1], 1))
+            for name in metrics:
+                window = [v for v in series[name][lo:hi] if not math.isnan(v)]
+                result[name].append(round(sum(window) / len(window), 2) if window else None)
+        return result
+
+    def memory_bytes(self):
+        return self._timestamps.itemsize * self.capacity + sum(
+            buf.itemsize * self.capacity for buf in self._values.values()
+        )
+
+
+class _Probe:
+    __slots__ = ("name", "section", "func", "interval", "next_due", "collected_at", "duration_ms", "errors")
+
+    def __init__(self, name, section, func, interval):
+        self.name = name
+        self.section = section          # Nøkkel i statusdict (samme struktur som get_system_status())
+        self.func = func
+        self.interval = interval
+        self.next_due = 0.0
+        self.collected_at = None        # time.time() for siste vellykkede måling
+        self.duration_ms = None
+        self.errors = 0
+
+
+class SystemMetricsCollector:
+    def __init__(self, config=None):
+        config = {**DEFAULT_COLLECTOR_CONFIG, **(config or {})}
+        self.fast_interval = float(config["fast_interval_sec"])
+        self.history_resolution = float(config["history_resolution_sec"])
+        capacity = max(1, int(float(config["history_hours"]) * 3600 / self.history_resolution))
+        self.history = MetricsHistory(capacity, HISTORY_METRICS)
+        self._next_history = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._status = {section: {} for section in ("system", "app", "cpu", "memory", "disk", "updates")}
+
+        self._fast_probes = [
+            _Probe("system_time", "system", get_system_time, self.fast_interval),
+            _Probe("uptime", "system", get_uptime, self.fast_interval),
+            _Probe("app_uptime", "app", get_app_uptime, self.fast_interval),
+            _Probe("cpu_temp", "cpu", get_cpu_temperature, self.fast_interval),
+            _Probe("cpu_load", "cpu", get_cpu_load, self.fast_interval),
+            _Probe("memory", "memory", get_memory_usage, self.fast_interval),
+        ]
+        self._slow_probes = [
+            _Probe("disk", "disk", get_disk_usage, float(config["disk_interval_sec"])),
+            _Probe("updates", "updates", get_pending_updates, float(config["updates_interval_sec"])),
+        ]
+
+    # --- Livssyklus ---
+
+    def start(self):
+        """
+        Tar en første rask måling synkront (så API-et aldri ser et tomt bilde),
+        og starter deretter én tråd for raske og én for dyre målinger.
+        """
+        if self._threads:
+            return
+        self._run_due(self._fast_probes, time.monotonic())
+        for name, probes in (("metrics_fast", self._fast_probes), ("metrics_slow", self._slow_probes)):
+            thread = threading.Thread(target=self._loop, args=(probes,), name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Systemmetrikk-innsamler startet (raske målinger hvert {self.fast_interval:g}. sekund)")
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    # --- Innsamling ---
+
+    def _loop(self, probes):
+        record_history = probes is self._fast_probes
+        while not self._stop.is_set():
+            now = self._run_due(probes, time.monotonic())
+            next_due = min(probe.next_due for probe in probes)
+            if record_history:
+                if now >= self._next_history:
+                    self._record_history()
+                    self._next_history = now + self.history_resolution
+                next_due = min(next_due, self._next_history)
+            self._stop.wait(max(next_due - now, 0.0))
+
+    def _record_history(self):
+        with self._lock:
+            values = {
+                name: self._status[section].get(key)
+                for name, (section, key) in HISTORY_METRICS.items()
+            }
+        self.history.append(time.time(), values)
+
+    def _run_due(self, probes, now):
+        for probe in probes:
+            if probe.next_due > now:
+                continue
+            started = time.monotonic()
+            try:
+                values = probe.func()
+                with self._lock:
+                    self._status[probe.section].update(values)
+                probe.collected_at = time.time()
+            except Exception as e:
+                probe.errors += 1
+                logger.error(f"Måling '{probe.name}' feilet: {e}")
+            finished = time.monotonic()
+            probe.duration_ms = round((finished - started) * 1000, 2)
+            probe.next_due = finished + probe.interval
+            now = finished
+        return now
+
+    # --- Lesing ---
+
+    def get_status(self):
+        """
+        Returnerer siste systemstatus (samme struktur som get_system_status()).
+        """
+        with self._lock:
+            return {section: dict(values) for section, values in self._status.items()}
+
+    def collect_metrics(self):
+        """
+        Metrikker for /metrics fra siste øyeblikksbilde (ingen nye målinger ved scrape).
+        """
+        status = self.get_status()
+        gauges = (
+            ("garage_system_cpu_temp_celsius", "CPU-temperatur", "cpu", "cpu_temp_c"),
+            ("garage_system_load1", "Load-snitt siste minutt", "cpu", "load_1min"),
+            ("garage_system_load5", "Load-snitt siste 5 minutter", "cpu", "load_5min"),
+            ("garage_system_load15", "Load-snitt siste 15 minutter", "cpu", "load_15min"),
+            ("garage_system_memory_used_percent", "Brukt minne i prosent", "memory", "percent_used_mem"),
+            ("garage_system_memory_free_mb", "Tilgjengelig minne i MB", "memory", "free_mb"),
+            ("garage_system_disk_used_percent", "Brukt diskplass i prosent", "disk", "percent_used"),
+            ("garage_system_disk_free_gb", "Ledig diskplass i GB", "disk", "free_gb"),
+            ("garage_system_pending_updates", "Tilgjengelige apt-oppdateringer", "updates", "pending_updates"),
+            ("garage_system_uptime_seconds", "Oppetid for systemet", "system", "uptime_seconds"),
+            ("garage_app_uptime_seconds", "Oppetid for applikasjonen", "app", "app_uptime_seconds"),
+        )
+        return [
+            (name, "gauge", help_text, [({}, status[section].get(key))])
+            for name, help_text, section, key in gauges
+        ]
+
+    def get_snapshot(self):
+        """
+        Returnerer status sammen med tidspunkt og alder for siste raske måling,
+        samt alder/varighet/feil per måling.
+        """
+        now = time.time()
+        status = self.get_status()
+        probes = {}
+        for probe in self._fast_probes + self._slow_probes:
+            probes[probe.name] = {
+                "interval_sec": probe.interval,
+                "age_sec": round(now - probe.collected_at, 1) if probe.collected_at else None,
+                "duration_ms": probe.duration_ms,
+                "errors": probe.errors,
+            }
+        collected_at = max((p.collected_at for p in self._fast_probes if p.collected_at), default=None)
+        return {
+            "status": status,
+            "collected_at": datetime.fromtimestamp(collected_at).strftime("%Y-%m-%d %H:%M:%S") if collected_at else None,
+            "age_sec": round(now - collected_at, 1) if collected_at else None,
+            "probes": probes,
+        }
+
+
+_collector = None
+_collector_lock = threading.Lock()
+
+
+def get_collector():
+    """
+    Returnerer delt SystemMetricsCollector. Opprettes og startes ved første kall.
+    """
+    global _collector
+    with _collector_lock:
+        if _collector is None:
+            try:
+                config = get_config(paths.CONFIG_HEALTH_PATH).get("collector", {})
+            except Exception as e:
+                logger.warning(f"Kunne ikke lese collector-config, bruker standardverdier: {e}")
+                config = {}
+            _collector = SystemMetricsCollector(config)
+            _collector.start()
+            get_registry().register_collector(_collector.collect_metrics)
+        return _collector
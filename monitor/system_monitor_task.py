@@ -2,18 +2,21 @@ import threading
 import time
 from config import config_paths as paths
 from utils.logging.unified_logger import get_logger
-from utils.system_monitor import get_system_status, check_thresholds_and_log
-from utils.config_loader import load_config
+from utils.system_monitor import check_thresholds_and_log
+from monitor.system_metrics_collector import get_collector
+from utils.config_loader import get_config
 
 logger = get_logger("system_monitor", category="system", source="health")
 
 def start_system_monitor_task():
+    collector = get_collector()
+
     def monitor_loop():
         while True:
             try:
-                config = load_config(paths.CONFIG_HEALTH_PATH)
+                config = get_config(paths.CONFIG_HEALTH_PATH)
                 interval = config.get("alerts", {}).get("interval_minutes") or 15
-                status = get_system_status()
+                status = collector.get_status()
                 warnings = check_thresholds_and_log(status)
 
                 if config.get("alerts", {}).get("log_warning", True):
@@ -13,7 +13,8 @@ __all__ = [
     "system_routes",
     "log_routes",
     "sensor_routes",
-    "bootstrap_routes"
+    "bootstrap_routes",
+    "metrics_routes"
 ]
 
 from .config_routes import config_routes
@@ -24,6 +25,7 @@ from .system_routes import system_routes
 from .log_routes import log_routes
 from .sensor_routes import sensor_routes
 from .bootstrap_routes import bootstrap_routes
+from .metrics_routes import metrics_routes
 
 
 api.register_blueprint(config_routes)
@@ -34,4 +36,5 @@ api.register_blueprint(system_routes)
 api.register_blueprint(log_routes)
 api.register_blueprint(sensor_routes)
 api.register_blueprint(bootstrap_routes)
+api.register_blueprint(metrics_routes)
 
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify
 from config import config_paths
 from utils.auth import token_required
+from utils.http_cache import file_version, json_response
 from utils.logging.unified_logger import get_logger
 import logging
 
@@ -22,7 +23,8 @@ def get_bootstrap_status():
     
     path = config_paths.STATUS_BOOTSTRAP_PATH
 
-    if not path.exists():
+    version = file_version(path)
+    if version is None:
         logger.warning(f"Statusfil ikke funnet: {path}")
         return jsonify({
             "status": "unknown",
@@ -30,10 +32,12 @@ def get_bootstrap_status():
             "details": "Statusfil ikke funnet"
         }), 404
 
-    try:
+    def build():
         with open(path, "r") as f:
-            data = json.load(f)
-        return jsonify(data), 200
+            return json.load(f)
+
+    try:
+        return json_response("bootstrap:status", version, build)
     except Exception as e:
         logger.error(f"Feil ved lesing av statusfil: {e}")
         return jsonify({
@@ -49,7 +53,7 @@ def bootstrap_ping():
     logger.debug("Kall mottatt: /bootstrap/ping")
     path = config_paths.STATUS_BOOTSTRAP_PATH
 
-    if not path.exists():
+    if not os.path.exists(path):
         return jsonify({"ping": "not_ready"}), 503
 
     try:
@@ -1,9 +1,13 @@
 from utils.logging.unified_logger import get_logger
 # routes/log_routes.py
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response
 from utils.auth import token_required
 from config import config_paths as paths
+from utils.log_tail import tail_lines, count_lines, read_since, read_time_range
+from utils.file_watcher import FileWatcher
+from datetime import datetime
+import json
 import os
 import time
 
@@ -11,6 +15,12 @@ routes_logger = get_logger("routes", category="system")
 
 log_routes = Blueprint("log_routes", __name__)
 
+# Sekunder mellom heartbeat-kommentarer i follow-strømmen
+FOLLOW_HEARTBEAT_INTERVAL = 15
+
+# Maks antall records per tidsintervall-spørring
+MAX_RANGE_RECORDS = 5000
+
 # Gyldige loggtyper og deres filbaner
 VALID_LOGS = {
     "status": paths.LOG_STATUS_PATH,
@@ -42,11 +52,17 @@ def get_log(logtype):
     """
     Returnerer siste X linjer fra ønsket loggtype.
     Bruk valgfri query-param ?lines=50
+    ?total=true gir også totalt antall linjer i filen (ellers null).
+    ?rotated=false henter bare fra aktiv fil, ikke fra roterte backups (.1, .2, ...).
+    ?from=/&to= (epoch eller ISO) gir records i tidsintervallet fra jsonl-logger (se get_log_range).
     """
     log_path = VALID_LOGS.get(logtype.lower())
     if not log_path:
         return jsonify({"error": "Ugyldig loggtype"}), 400
 
+    if "from" in request.args or "to" in request.args:
+        return get_log_range(logtype, log_path)
+
     # Hent antall linjer fra query param
     try:
         lines_requested = int(request.args.get("lines", 50))
@@ -55,17 +71,20 @@ def get_log(logtype):
     except (ValueError, TypeError):
         lines_requested = 50
 
+    include_total = request.args.get("total", "false").lower() in ("1", "true", "yes")
+    include_rotated = request.args.get("rotated", "true").lower() not in ("0", "false", "no")
+
     try:
-        with open(log_path, "r") as f:
-            all_lines = f.readlines()
-            lines = all_lines[-lines_requested:]
+        # Leser baklengs fra slutten av filen i stedet for hele filen
+        lines = tail_lines(log_path, lines_requested, include_rotated=include_rotated)
+        total_lines = count_lines(log_path) if include_total else None
 
         last_modified = time.ctime(os.path.getmtime(log_path))
 
         return jsonify({
             "logtype": logtype,
             "lines": lines,
-            "total_lines": len(all_lines),
+            "total_lines": total_lines,
             "returned_lines": len(lines),
             "last_modified": last_modified
         })
@@ -73,4 +92,130 @@ def get_log(logtype):
     except FileNotFoundError:
         routes_logger.warning("API/get_log 404: Loggfil ikke funnet")
         return jsonify({"error": "Loggfil ikke funnet"}), 404
-    
\ No newline at end of file
+
+
+def _parse_int_arg(value):
+    try:
+        return int(value) if value is not None else None
+    except (ValueError, TypeError):
+        return None
+
+
+def _parse_time_arg(value):
+    """
+    Tolker tidspunkt fra query-param: epoch-sekunder eller ISO-format ("2025-05-28T12:00").
+    """
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def get_log_range(logtype, log_path):
+    """
+    Records (JSON-objekter) med tidsstempel i [from, to] fra en logg med "format": "jsonl".
+    Minuttindeksen (<fil>.idx) brukes til å seke rett til starten av intervallet.
+    ?limit=500 (maks MAX_RANGE_RECORDS), ?rotated=false som for vanlig tail.
+    """
+    try:
+        start_ts = _parse_time_arg(request.args.get("from"))
+        end_ts = _parse_time_arg(request.args.get("to"))
+    except ValueError:
+        return jsonify({"error": "Ugyldig tidspunkt i from/to"}), 400
+
+    limit = _parse_int_arg(request.args.get("limit")) or 500
+    limit = max(1, min(limit, MAX_RANGE_RECORDS))
+    include_rotated = request.args.get("rotated", "true").lower() not in ("0", "false", "no")
+
+    try:
+        records = read_time_range(log_path, start_ts, end_ts, limit=limit, include_rotated=include_rotated)
+    except FileNotFoundError:
+        routes_logger.warning("API/get_log_range 404: Loggfil ikke funnet")
+        return jsonify({"error": "Loggfil ikke funnet"}), 404
+
+    return jsonify({
+        "logtype": logtype,
+        "from": start_ts,
+        "to": end_ts,
+        "records": records,
+        "returned_records": len(records),
+        "truncated": len(records) >= limit,
+    })
+
+
+@log_routes.route("/api/logs/<logtype>/follow", methods=["GET"])
+@token_required
+def follow_log(logtype):
+    """
+    Returnerer bare bytes lagt til siden klientens forrige cursor.
+    Bruk ?cursor=<offset>&inode=<inode> fra forrige svar. Uten cursor returneres
+    slutten av filen som startpunkt. Rotasjon oppdages via endret inode.
+    """
+    log_path = VALID_LOGS.get(logtype.lower())
+    if not log_path:
+        return jsonify({"error": "Ugyldig loggtype"}), 400
+
+    cursor = _parse_int_arg(request.args.get("cursor"))
+    inode = _parse_int_arg(request.args.get("inode"))
+    try:
+        result = read_since(log_path, cursor=cursor, inode=inode)
+    except FileNotFoundError:
+        routes_logger.warning("API/follow_log 404: Loggfil ikke funnet")
+        return jsonify({"error": "Loggfil ikke funnet"}), 404
+
+    return jsonify({"logtype": logtype, **result})
+
+
+@log_routes.route("/api/logs/<logtype>/follow/stream", methods=["GET"])
+@token_required
+def follow_log_stream(logtype):
+    """
+    Server-Sent Events med nye logglinjer. Filen overvåkes med inotify (fallback: stat-polling).
+    Event-ID er "<inode>:<cursor>", slik at Last-Event-ID kan brukes til å gjenoppta.
+    """
+    log_path = VALID_LOGS.get(logtype.lower())
+    if not log_path:
+        return jsonify({"error": "Ugyldig loggtype"}), 400
+    if not os.path.exists(log_path):
+        return jsonify({"error": "Loggfil ikke funnet"}), 404
+
+    cursor = _parse_int_arg(request.args.get("cursor"))
+    inode = _parse_int_arg(request.args.get("inode"))
+    last_event_id = request.headers.get("Last-Event-ID")
+    if last_event_id and ":" in last_event_id:
+        inode_str, cursor_str = last_event_id.split(":", 1)
+        inode, cursor = _parse_int_arg(inode_str), _parse_int_arg(cursor_str)
+
+    def generate():
+        nonlocal cursor, inode
+        watcher = FileWatcher(log_path)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    result = read_since(log_path, cursor=cursor, inode=inode)
+                except FileNotFoundError:
+                    # Filen er midt i en rotasjon – vent på at ny fil opprettes
+                    watcher.wait(1.0)
+                    continue
+
+                if result["data"] or result["rotated"] or cursor is None:
+                    cursor, inode = result["cursor"], result["inode"]
+                    payload = json.dumps(
+                        {"data": result["data"], "rotated": result["rotated"]},
+                        separators=(",", ":"),
+                    )
+                    yield f"id: {inode}:{cursor}\nevent: log\ndata: {payload}\n\n"
+                if result["more"]:
+                    continue
+                if not watcher.wait(FOLLOW_HEARTBEAT_INTERVAL):
+                    yield ": heartbeat\n\n"
+        finally:
+            watcher.close()
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
@@ -0,0 +1,19 @@
+# routes/api/metrics_routes.py
+
+from flask import Blueprint, Response
+from utils.auth import token_required
+from utils.metrics import get_registry
+
+metrics_routes = Blueprint("metrics_routes", __name__)
+
+# Prometheus tekstformat 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@metrics_routes.route("/metrics", methods=["GET"])
+@token_required
+def get_metrics():
+    """
+    Returnerer alle metrikker i Prometheus-format (ferdig rendret tekst caches kort).
+    """
+    return Response(get_registry().render(), content_type=CONTENT_TYPE)
@@ -3,7 +3,7 @@ from utils.logging.unified_logger import get_logger
 
 from flask import Blueprint, jsonify, request
 from utils.auth import token_required
-from core.system import controller
+from core.system import get_controller
 
 port_routes = Blueprint("port_routes", __name__)
 
@@ -11,7 +11,7 @@ port_routes = Blueprint("port_routes", __name__)
 @token_required
 def api_open_port(port):
     try:
-        result = controller.open_port(port)
+        result = get_controller().open_port(port)
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -21,7 +21,7 @@ def api_open_port(port):
 @token_required
 def api_close_port(port):
     try:
-        result = controller.close_port(port)
+        result = get_controller().close_port(port)
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -31,7 +31,16 @@ def api_close_port(port):
 @token_required
 def api_stop_port(port):
     try:
-        result = controller.stop_port(port)
+        result = get_controller().stop_port(port)
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+@port_routes.route("/port/relay/<int:command_id>", methods=["GET"])
+@token_required
+def api_relay_command_status(command_id):
+    command = get_controller().get_relay_command(command_id)
+    if command is None:
+        return jsonify({"error": f"Ukjent kommando-ID: {command_id}"}), 404
+    return jsonify(command)
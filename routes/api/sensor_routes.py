@@ -1,70 +1,91 @@
 from utils.logging.unified_logger import get_logger
 import os
-import re
 import json
+from datetime import datetime
 from flask import Blueprint, jsonify, request
 from utils.auth import token_required
+from utils.http_cache import json_response
 from config import config_paths
-from sensors.environment_manager import EnvironmentSensorManager
+from sensors.environment_manager import get_environment_manager
+from sensors.env_timeseries import get_timeseries_store, is_valid_sensor_id
 
 
 sensor_api_logger = get_logger("sensor_routes", category="system")
 
 sensor_routes = Blueprint("sensor_routes", __name__, url_prefix="/sensors/environment")
-sensor_manager = EnvironmentSensorManager()
 
 @sensor_routes.route("/latest", methods=["GET"])
 @token_required
 def get_latest_sensor_data():
+    """
+    Siste måling per sensor, servert fra minnet i sensormanageren.
+    ETag følger manageren sitt sekvensnummer (økes bare når en verdi endres).
+    """
     try:
-        path = config_paths.STATUS_SENSOR_ENV_PATH
-        if not os.path.exists(path):
+        seq, latest = get_environment_manager().get_latest()
+        if not latest:
             return jsonify({"error": "Ingen sensordata funnet"}), 404
 
-        with open(path, "r") as f:
-            data = json.load(f)
-        return jsonify({"sensors": data})
+        return json_response("sensors:latest", seq, lambda: {"sensors": latest})
 
     except Exception as e:
-        sensor_api_logger.error("sensor_routes", f"Feil i /sensors/environment/latest: {str(e)}")
+        sensor_api_logger.error(f"Feil i /sensors/environment/latest: {str(e)}")
         return jsonify({"error": "Kunne ikke hente sensorstatus"}), 500
 
+def _parse_time_arg(value):
+    """
+    Tolker tidspunkt fra query-param: epoch-sekunder eller ISO-format ("2025-05-28T12:00", "2025-05-28 12:00:00").
+    """
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
 @sensor_routes.route("/history", methods=["GET"])
 @token_required
 def get_sensor_history():
-    path = config_paths.LOG_SENSOR_ENV_PATH
+    """
+    Returnerer historikk fra tidsseriedatabasen.
+    ?sensor=bme1 filtrerer på sensor, ?from=/&to= gir tidsintervall (epoch eller ISO),
+    uten intervall returneres de siste ?limit=50 målingene.
+    """
     sensor_filter = request.args.get("sensor")
     limit = int(request.args.get("limit", 50))
+    if sensor_filter and not is_valid_sensor_id(sensor_filter):
+        return jsonify({"error": "Ugyldig sensor-ID"}), 400
 
-    if not os.path.exists(path):
-        return jsonify({"error": "Sensor-loggfil ikke funnet"}), 404
+    try:
+        start_ts = _parse_time_arg(request.args.get("from"))
+        end_ts = _parse_time_arg(request.args.get("to"))
+    except ValueError:
+        return jsonify({"error": "Ugyldig tidspunkt i from/to"}), 400
 
     try:
-        with open(path, "r") as f:
-            lines = f.readlines()
+        store = get_timeseries_store()
+        sensor_ids = [sensor_filter] if sensor_filter else store.list_sensors()
+        if not sensor_ids:
+            return jsonify({"error": "Ingen sensorhistorikk funnet"}), 404
 
-        pattern = re.compile(r"^(.*?)\s+\[.*?\]\s+.*?:\s*(\w+):\s*Temp: ([\d.]+)\u00b0C.*Hum: ([\d.]+)%.*Press: ([\d.]+) hPa")
         entries = []
-        for line in reversed(lines):
-            match = pattern.search(line)
-            if match:
-                timestamp, sensor_id, temp, hum, press = match.groups()
-                if sensor_filter and sensor_id != sensor_filter:
-                    continue
-                entries.append({
-                    "timestamp": timestamp,
-                    "sensor": sensor_id,
-                    "temperature": float(temp),
-                    "humidity": float(hum),
-                    "pressure": float(press)
-                })
-            if len(entries) >= limit:
-                break
+        for sensor_id in sensor_ids:
+            if start_ts is not None or end_ts is not None:
+                entries += store.query(sensor_id, start_ts, end_ts, limit=limit)
+            else:
+                entries += store.latest(sensor_id, limit)
 
-        return jsonify({"history": list(reversed(entries))})
+        entries.sort(key=lambda e: e["epoch"])
+        if start_ts is not None or end_ts is not None:
+            entries = entries[:limit]
+        else:
+            entries = entries[-limit:]
+
+        return jsonify({"history": entries})
 
     except Exception as e:
-        sensor_api_logger.error("sensor_routes", f"Feil i /sensors/environment/history: {str(e)}")
+        sensor_api_logger.error(f"Feil i /sensors/environment/history: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 @sensor_routes.route("/averages", methods=["GET"])
@@ -99,10 +120,38 @@ def get_sensor_averages():
         sensor_api_logger.error("sensor_routes", f"Feil i /sensors/environment/averages: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@sensor_routes.route("/rollups", methods=["GET"])
+@token_required
+def get_sensor_rollups():
+    """
+    Returnerer aggregater fra rollup-motoren (ingen lesing av rådata).
+    ?res=minute|hour|day, ?sensor=bme1, ?limit=24, ?current=false utelater pågående periode.
+    """
+    resolution = request.args.get("res", "hour")
+    sensor_filter = request.args.get("sensor")
+    limit = request.args.get("limit", type=int)
+    include_current = request.args.get("current", "true").lower() != "false"
+
+    try:
+        rollups = get_environment_manager().rollups.get(resolution, sensor_filter, limit, include_current)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"resolution": resolution, "rollups": rollups})
+
+@sensor_routes.route("/scheduler", methods=["GET"])
+@token_required
+def get_scheduler_status():
+    """
+    Returnerer leseplanen per sensor: intervall, tid til neste lesing og tapte frister.
+    """
+    return jsonify(get_environment_manager().get_scheduler_stats())
+
 @sensor_routes.route("/logging", methods=["GET"])
 @token_required
 def get_logging_status():
     try:
+        sensor_manager = get_environment_manager()
         return jsonify({
             "logging_enabled": sensor_manager.is_logging_enabled(),
             "log_interval_seconds": sensor_manager.log_interval
@@ -116,10 +165,22 @@ def get_logging_status():
 def set_logging_status():
     try:
         body = request.get_json()
+        interval = None
+        if "interval" in body:
+            try:
+                if isinstance(body["interval"], bool):
+                    raise ValueError
+                interval = int(body["interval"])
+            except (TypeError, ValueError):
+                interval = 0
+            if interval <= 0:
+                return jsonify({"error": "interval må være et positivt heltall (sekunder)"}), 400
+
+        sensor_manager = get_environment_manager()
         if "enabled" in body:
             sensor_manager.set_logging_enabled(bool(body["enabled"]))
-        if "interval" in body:
-            sensor_manager.set_log_interval(int(body["interval"]))
+        if interval is not None:
+            sensor_manager.set_log_interval(interval)
 
         return jsonify({
             "message": "Oppdatert logging",
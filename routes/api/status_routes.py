@@ -4,28 +4,45 @@ from utils.logging.unified_logger import get_logger
 # API-endepunkt for portstatus
 # ==========================================
 
-from flask import Blueprint, jsonify
-from core.system import controller
+import json
+
+from flask import Blueprint, jsonify, request, Response
+from core.system import get_controller
 from utils.auth import token_required
+from utils.event_bus import get_event_bus
+from utils.http_cache import json_response
 
 
 status_routes = Blueprint("status_routes", __name__)
 
+# Sekunder mellom heartbeat-kommentarer når det ikke kommer hendelser
+SSE_HEARTBEAT_INTERVAL = 15
+
+@status_routes.route("/status/sensors", methods=["GET"])
+@token_required
+def sensor_debounce_stats():
+    """
+    Debounce-tellere per sensorpinne: rå, aksepterte og undertrykte flanker.
+    """
+    return jsonify(get_controller().get_sensor_stats()), 200
+
+
 @status_routes.route("/status/<port>", methods=["GET"])
 @token_required
 def port_status(port):
     """
     Returnerer status for spesifisert port.
     """
+    controller = get_controller()
     valid_ports = controller.get_ports()
     if port not in valid_ports:
         return jsonify({"error": f"Ugyldig portnavn: {port}"}), 400
 
-    status = controller.get_current_status(port)
-    return jsonify({
+    snapshot = controller.get_state_snapshot()
+    return json_response(f"status:{port}", snapshot.version, lambda: {
         "port": port,
-        "status": status
-    }), 200
+        "status": snapshot.ports[port]["status"] if port in snapshot.ports else "unknown"
+    })
 
 
 @status_routes.route("/status", methods=["GET"])
@@ -34,4 +51,50 @@ def all_status():
     """
     Returnerer status for alle porter.
     """
-    return jsonify(controller.get_all_status()), 200
+    controller = get_controller()
+    snapshot = controller.get_state_snapshot()
+    return json_response("status", snapshot.version, lambda: {
+        port: snapshot.ports[port]["status"] if port in snapshot.ports else "unknown"
+        for port in controller.get_ports()
+    })
+
+
+def _format_sse(event_id, event_type, data):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+@status_routes.route("/status/stream", methods=["GET"])
+@token_required
+def status_stream():
+    """
+    Server-Sent Events med statusendringer for alle porter.
+    Første melding er et øyeblikksbilde, med mindre klienten kan gjenoppta via Last-Event-ID.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        last_event_id = None
+
+    bus = get_event_bus("port_status")
+    subscription, resumed = bus.subscribe(last_event_id=last_event_id)
+    snapshot = None if resumed else get_controller().get_all_status()
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            if snapshot is not None:
+                yield _format_sse(subscription.start_id, "snapshot", snapshot)
+            while True:
+                event = subscription.get(timeout=SSE_HEARTBEAT_INTERVAL)
+                if event is None:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield _format_sse(event["id"], event["type"], event["data"])
+        finally:
+            subscription.close()
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
@@ -1,13 +1,16 @@
 from utils.logging.unified_logger import get_logger
 # routes/system_routes.py
-import datetime, os, json
+import datetime, os, json, time
 
 from flask import Blueprint, jsonify, request
-from utils.auth import token_required
+from utils.auth import token_required, get_auth_stats
 #from utils.config_loader import load_config
 from config import config_paths as paths
-from utils.system_monitor import get_system_status, check_thresholds_and_log, run_system_health_check, get_diagnostics
-from monitor.monitor_registry import get_registry_status
+from utils.system_monitor import check_thresholds_and_log, run_system_health_check, get_diagnostics
+from monitor.system_metrics_collector import get_collector
+from monitor.monitor_registry import get_registry_status, get_registry_version
+from utils.http_cache import json_response
+from utils.request_metrics import get_request_metrics
 
 
 system_routes = Blueprint("system_routes", __name__, url_prefix="/system")
@@ -77,11 +80,14 @@ def get_bootstrap_status():
 @token_required
 def get_rpi_status():
     try:
-        status = get_system_status()
-        warnings = check_thresholds_and_log(status)
+        snapshot = get_collector().get_snapshot()
+        warnings = check_thresholds_and_log(snapshot["status"])
         return jsonify({
-            "status": status,
-            "warnings": warnings
+            "status": snapshot["status"],
+            "warnings": warnings,
+            "collected_at": snapshot["collected_at"],
+            "age_sec": snapshot["age_sec"],
+            "probes": snapshot["probes"]
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -99,8 +105,8 @@ def get_system_health():
 @token_required
 def rpi_diagnostics():
     try:
-        status = get_system_status()
-        report = get_diagnostics(status)
+        snapshot = get_collector().get_snapshot()
+        report = get_diagnostics(snapshot["status"])
 
         total = len(report)
         warnings = [
@@ -120,7 +126,9 @@ def rpi_diagnostics():
         return jsonify({
             "summary": summary,
             "diagnostics": report,
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "collected_at": snapshot["collected_at"],
+            "age_sec": snapshot["age_sec"]
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -131,5 +139,54 @@ def get_monitors_status():
     """
     Returnerer status for alle aktive monitorer.
     """
-    status = get_registry_status()
-    return jsonify(status)
+    return json_response("monitors", get_registry_version(), get_registry_status)
+
+
+@system_routes.route("/metrics/history", methods=["GET"])
+@token_required
+def get_metrics_history():
+    """
+    Returnerer trenddata fra ringbufferne i bakgrunnsinnsamleren.
+    ?points=120 nedsampler (snitt per bøtte), ?metrics=cpu_temp,load_1min velger metrikker,
+    ?hours=6 begrenser tidsvinduet.
+    """
+    try:
+        points = request.args.get("points", type=int)
+        hours = request.args.get("hours", type=float)
+        metrics = request.args.get("metrics")
+        metrics = [m.strip() for m in metrics.split(",") if m.strip()] if metrics else None
+
+        history = get_collector().history
+        if metrics:
+            unknown = [m for m in metrics if m not in history.metrics]
+            if unknown:
+                return jsonify({"error": f"Ukjente metrikker: {', '.join(unknown)}", "available": list(history.metrics)}), 400
+        if points is not None and points <= 0:
+            return jsonify({"error": "points må være større enn 0"}), 400
+
+        since = time.time() - hours * 3600 if hours else None
+        return jsonify({
+            "resolution_sec": get_collector().history_resolution,
+            "capacity": history.capacity,
+            "series": history.query(points=points, metrics=metrics, since=since)
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@system_routes.route("/perf", methods=["GET"])
+@token_required
+def get_perf():
+    """
+    Returnerer responstider (p50/p95/p99) per rute og blueprint, siden oppstart og i glidende vindu.
+    """
+    return jsonify(get_request_metrics().get_report())
+
+
+@system_routes.route("/auth_stats", methods=["GET"])
+@token_required
+def get_auth_statistics():
+    """
+    Returnerer tellere for token-cachen (hits/misses/reloads) og godkjente/avviste kall.
+    """
+    return jsonify(get_auth_stats())
@@ -30,10 +30,10 @@ class BME280Sensor:
             raise
 
     def read_data(self):
+        """
+        Leser sensoren umiddelbart. Intervallet styres av planleggeren i EnvironmentSensorManager.
+        """
         now = time.time()
-        if now - self.last_read_time < self.interval_sec:
-            return None
-
         try:
             data = sample(self.bus, self.address, self.calibration_params)
 
@@ -0,0 +1,185 @@
+# sensors/env_rollups.py
+
+"""
+Strømmende aggregering (rollups) av miljødata på minutt-, time- og døgnnivå.
+
+Hver ny måling oppdaterer løpende aggregater (antall, sum, min, maks og varians via
+Welfords algoritme) for den aktive perioden i O(1). Når en måling havner i en ny periode,
+lukkes den forrige og legges i en begrenset historikk (retention per oppløsning).
+Lukkede perioder lagres i ENV_ROLLUPS_PATH slik at historikken overlever omstart.
+"""
+
+import json
+import math
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+from config import config_paths
+from utils.file_utils import atomic_write_json
+from utils.logging.unified_logger import get_logger
+
+logger = get_logger("env_rollups", category="system")
+
+METRICS = ("temperature", "humidity", "pressure")
+
+# Periodelengde i sekunder per oppløsning
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+
+# Antall lukkede perioder som beholdes (24 t minutter, 14 døgn timer, 1 år døgn)
+DEFAULT_RETENTION = {"minute": 1440, "hour": 336, "day": 365}
+
+
+class RunningStats:
+    __slots__ = ("count", "total", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        # Welford: numerisk stabil løpende varians
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self):
+        variance = self.m2 / (self.count - 1) if self.count > 1 else 0.0
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "mean": round(self.mean, 3),
+            "min": self.min,
+            "max": self.max,
+            "variance": round(variance, 4),
+            "stddev": round(math.sqrt(variance), 3),
+        }
+
+
+def _bucket_start(ts, resolution):
+    if resolution == "day":
+        # Døgn følger lokal midnatt
+        return datetime.fromtimestamp(ts).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    size = RESOLUTIONS[resolution]
+    return ts - ts % size
+
+
+class RollupEngine:
+    def __init__(self, retention=None, path=None, on_close=None):
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self.path = path or config_paths.ENV_ROLLUPS_PATH
+        self.on_close = on_close            # Kalles med (sensor_id, resolution, entry) når en periode lukkes
+        self._lock = threading.Lock()
+        self._current = {}                  # (sensor_id, resolution) -> (periodestart, {metrikk: RunningStats})
+        self._closed = {}                   # (sensor_id, resolution) -> deque av lukkede perioder
+        self._load()
+
+    def add_readings(self, readings, ts):
+        """
+        Legger til alle målinger i et read_all()-resultat: {sensor_id: {temperature, humidity, pressure}}.
+        """
+        for sensor_id, values in readings.items():
+            self.add_sample(sensor_id, ts, values)
+
+    def add_sample(self, sensor_id, ts, values):
+        closed = []
+        with self._lock:
+            for resolution in RESOLUTIONS:
+                key = (sensor_id, resolution)
+                start = _bucket_start(ts, resolution)
+                current = self._current.get(key)
+                if current is None or current[0] != start:
+                    if current is not None:
+                        entry = self._to_entry(sensor_id, resolution, *current)
+                        self._closed_deque(key).append(entry)
+                        closed.append((sensor_id, resolution, entry))
+                    current = (start, {metric: RunningStats() for metric in METRICS})
+                    self._current[key] = current
+                for metric in METRICS:
+                    if values.get(metric) is not None:
+                        current[1][metric].add(values[metric])
+
+        # Callback og lagring utenfor låsen
+        for sensor_id, resolution, entry in closed:
+            if self.on_close:
+                try:
+                    self.on_close(sensor_id, resolution, entry)
+                except Exception as e:
+                    logger.error(f"Feil i on_close for {sensor_id}/{resolution}: {e}")
+        if any(resolution != "minute" for _, resolution, _ in closed):
+            self.save()
+
+    def get(self, resolution, sensor_id=None, limit=None, include_current=True):
+        """
+        Returnerer perioder for gitt oppløsning (eldste først), evt. filtrert på sensor.
+        Med include_current tas den pågående perioden med (markert "partial": true).
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Ukjent oppløsning: {resolution}")
+        result = {}
+        with self._lock:
+            for (sid, res), entries in self._closed.items():
+                if res == resolution and (sensor_id is None or sid == sensor_id):
+                    result[sid] = list(entries)
+            if include_current:
+                for (sid, res), current in self._current.items():
+                    if res == resolution and (sensor_id is None or sid == sensor_id):
+                        entry = self._to_entry(sid, res, *current)
+                        entry["partial"] = True
+                        result.setdefault(sid, []).append(entry)
+        if limit:
+            result = {sid: entries[-limit:] for sid, entries in result.items()}
+        return result
+
+    def save(self):
+        """
+        Lagrer lukkede time- og døgnperioder (minuttperioder holdes bare i minnet).
+        """
+        with self._lock:
+            data = {
+                f"{sid}|{res}": list(entries)
+                for (sid, res), entries in self._closed.items() if res != "minute"
+            }
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            atomic_write_json(self.path, data)
+        except Exception as e:
+            logger.error(f"Kunne ikke lagre rollups til {self.path}: {e}")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for key, entries in data.items():
+                sensor_id, resolution = key.split("|", 1)
+                if resolution in RESOLUTIONS:
+                    self._closed_deque((sensor_id, resolution)).extend(entries)
+            logger.info(f"Lastet rollups fra {self.path}")
+        except Exception as e:
+            logger.error(f"Kunne ikke lese rollups fra {self.path}: {e}")
+
+    def _closed_deque(self, key):
+        if key not in self._closed:
+            self._closed[key] = deque(maxlen=int(self.retention[key[1]]))
+        return self._closed[key]
+
+    @staticmethod
+    def _to_entry(sensor_id, resolution, start, stats):
+        return {
+            "sensor": sensor_id,
+            "resolution": resolution,
+            "start": datetime.fromtimestamp(start).strftime("%Y-%m-%d %H:%M:%S"),
+            "epoch": start,
+            "metrics": {metric: stat.to_dict() for metric, stat in stats.items()},
+        }
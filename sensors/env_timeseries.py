@@ -0,0 +1,217 @@
+# sensors/env_timeseries.py
+
+"""
+Kompakt, append-only tidsseriedatabase for miljøsensorer.
+
+Hver måling lagres som en binær post med fast bredde (tidspunkt, temperatur, fuktighet, trykk)
+i én fil per sensor per døgn (UTC): <ENV_TIMESERIES_DIR>/<sensor_id>/<ÅÅÅÅ-MM-DD>.bin.
+Døgnfilene fungerer som indeks: et tidsintervall gir direkte hvilke filer som må åpnes,
+og innen hver fil finnes start/slutt med binærsøk over en minnemappet (mmap) fil.
+"""
+
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+
+from config import config_paths
+from utils.logging.unified_logger import get_logger
+
+logger = get_logger("env_timeseries", category="system")
+
+# Post: tidspunkt (epoch, float64), temperatur, fuktighet, trykk (float32) – 20 bytes
+RECORD = struct.Struct("<dfff")
+DAY_SECONDS = 86400
+
+# Sensor-ID brukes som katalognavn, så kun trygge tegn tillates (ingen "/" eller "..")
+_SENSOR_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def is_valid_sensor_id(sensor_id):
+    return isinstance(sensor_id, str) and bool(_SENSOR_ID_RE.match(sensor_id))
+
+
+def _day_name(ts):
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+
+def _day_start(day_name):
+    return datetime.strptime(day_name, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+
+
+def _to_entry(sensor_id, record):
+    ts, temperature, humidity, pressure = record
+    return {
+        "timestamp": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+        "epoch": round(ts, 3),
+        "sensor": sensor_id,
+        "temperature": round(temperature, 2),
+        "humidity": round(humidity, 2),
+        "pressure": round(pressure, 2),
+    }
+
+
+class EnvTimeSeriesStore:
+    def __init__(self, base_dir=None):
+        self.base_dir = base_dir or config_paths.ENV_TIMESERIES_DIR
+        self._lock = threading.Lock()
+        self._last_ts = {}      # sensor_id -> siste skrevne tidspunkt (for rekkefølgesjekk)
+
+    # --- Skriving ---
+
+    def append(self, sensor_id, ts, temperature, humidity, pressure):
+        """
+        Legger til én måling. Målinger eldre enn forrige post for sensoren hoppes over
+        (f.eks. etter at klokken er stilt tilbake), slik at filene alltid er sortert.
+        """
+        if not is_valid_sensor_id(sensor_id):
+            logger.error(f"Ugyldig sensor-ID for tidsserie: {sensor_id!r}")
+            return False
+        with self._lock:
+            last = self._last_ts.get(sensor_id)
+            if last is None:
+                last = self._read_last_ts(sensor_id)
+            if last is not None and ts <= last:
+                logger.debug(f"{sensor_id}: hopper over måling ute av rekkefølge ({ts} <= {last})")
+                return False
+
+            path = self._segment_path(sensor_id, _day_name(ts))
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "ab") as f:
+                    f.write(RECORD.pack(ts, temperature, humidity, pressure))
+                self._last_ts[sensor_id] = ts
+                return True
+            except Exception as e:
+                logger.error(f"{sensor_id}: Kunne ikke skrive til tidsserie {path}: {e}")
+                return False
+
+    def append_readings(self, readings, ts=None):
+        """
+        Skriver alle målinger i et read_all()-resultat: {sensor_id: {temperature, humidity, pressure}}.
+        """
+        ts = ts or time.time()
+        for sensor_id, values in readings.items():
+            self.append(sensor_id, ts, values["temperature"], values["humidity"], values["pressure"])
+
+    # --- Lesing ---
+
+    def list_sensors(self):
+        try:
+            return sorted(
+                name for name in os.listdir(self.base_dir)
+                if os.path.isdir(os.path.join(self.base_dir, name))
+            )
+        except FileNotFoundError:
+            return []
+
+    def query(self, sensor_id, start_ts=None, end_ts=None, limit=None):
+        """
+        Returnerer målinger med start_ts <= tidspunkt <= end_ts, eldste først.
+        """
+        start_ts = start_ts if start_ts is not None else 0.0
+        end_ts = end_ts if end_ts is not None else time.time() + DAY_SECONDS
+        entries = []
+        for day in self._segments(sensor_id):
+            day_start = _day_start(day)
+            if day_start + DAY_SECONDS <= start_ts or day_start > end_ts:
+                continue
+            for record in self._read_range(self._segment_path(sensor_id, day), start_ts, end_ts):
+                entries.append(_to_entry(sensor_id, record))
+                if limit and len(entries) >= limit:
+                    return entries
+        return entries
+
+    def latest(self, sensor_id, limit):
+        """
+        Returnerer de siste limit målingene for sensoren, eldste først.
+        Leser bare halen av døgnfilene (seek), ikke hele filene.
+        """
+        records = []
+        for day in reversed(self._segments(sensor_id)):
+            records = self._read_tail(self._segment_path(sensor_id, day), limit - len(records)) + records
+            if len(records) >= limit:
+                break
+        return [_to_entry(sensor_id, record) for record in records]
+
+    # --- Interne hjelpere ---
+
+    def _sensor_dir(self, sensor_id):
+        if not is_valid_sensor_id(sensor_id):
+            raise ValueError(f"Ugyldig sensor-ID: {sensor_id!r}")
+        return os.path.join(self.base_dir, sensor_id)
+
+    def _segment_path(self, sensor_id, day):
+        return os.path.join(self._sensor_dir(sensor_id), f"{day}.bin")
+
+    def _segments(self, sensor_id):
+        try:
+            return sorted(
+                name[:-4] for name in os.listdir(self._sensor_dir(sensor_id))
+                if name.endswith(".bin")
+            )
+        except FileNotFoundError:
+            return []
+
+    def _read_last_ts(self, sensor_id):
+        segments = self._segments(sensor_id)
+        if not segments:
+            return None
+        records = self._read_tail(self._segment_path(sensor_id, segments[-1]), 1)
+        return records[-1][0] if records else None
+
+    def _read_tail(self, path, count):
+        """Leser de siste count hele postene i filen (halvskrevet post på slutten ignoreres)."""
+        if count <= 0:
+            return []
+        with open(path, "rb") as f:
+            total = os.fstat(f.fileno()).st_size // RECORD.size
+            first = max(0, total - count)
+            f.seek(first * RECORD.size)
+            data = f.read((total - first) * RECORD.size)
+        usable = len(data) - len(data) % RECORD.size
+        return list(RECORD.iter_unpack(data[:usable]))
+
+    def _read_range(self, path, start_ts, end_ts):
+        size = os.path.getsize(path)
+        count = size // RECORD.size
+        if count == 0:
+            return []
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), count * RECORD.size, access=mmap.ACCESS_READ) as mm:
+            lo = self._bisect(mm, count, start_ts, inclusive=False)
+            hi = self._bisect(mm, count, end_ts, inclusive=True)
+            return list(RECORD.iter_unpack(mm[lo * RECORD.size:hi * RECORD.size]))
+
+    @staticmethod
+    def _bisect(mm, count, ts, inclusive):
+        """
+        Binærsøk på tidspunkt. inclusive=False gir første post >= ts,
+        inclusive=True gir første post > ts.
+        """
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = struct.unpack_from("<d", mm, mid * RECORD.size)[0]
+            if value < ts or (inclusive and value == ts):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_timeseries_store():
+    """
+    Returnerer delt EnvTimeSeriesStore-instans.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EnvTimeSeriesStore()
+        return _store
@@ -1,15 +1,37 @@
+import heapq
+import itertools
 import os
+import random
 import time
 import threading
 import json
 from datetime import datetime, time as dt_time
 from utils.config_loader import load_config
+from utils.file_utils import atomic_write_json
 from config import config_paths
 from utils.logging.unified_logger import get_logger
 from sensors.bme280_sensor import BME280Sensor
+from sensors.env_timeseries import get_timeseries_store
+from sensors.env_rollups import RollupEngine
+from utils.metrics import get_registry
+
+_metrics = get_registry()
+ENV_GAUGES = {
+    "temperature": _metrics.gauge("garage_env_temperature_celsius", "Siste temperatur per miljøsensor", ("sensor",)),
+    "humidity": _metrics.gauge("garage_env_humidity_percent", "Siste relative fuktighet per miljøsensor", ("sensor",)),
+    "pressure": _metrics.gauge("garage_env_pressure_hpa", "Siste lufttrykk per miljøsensor", ("sensor",)),
+}
+ENV_READINGS = _metrics.counter("garage_env_readings_total", "Antall vellykkede sensorlesinger", ("sensor",))
 
 
 class EnvironmentSensorManager:
+    """
+    Eneste eier av miljøsensorene (I2C-bussen). Én tråd leser sensorene og publiserer
+    hver runde med målinger til alle abonnenter (statusfil, rollups, tidsserie, miljølogg).
+    Lesingene styres av en min-heap med neste frist per sensor (monotonic), slik at tråden
+    sover nøyaktig til neste sensor skal leses.
+    Bruk get_environment_manager() i stedet for å opprette egne instanser.
+    """
     SENSOR_TYPES = {
         "BME280": BME280Sensor
     }
@@ -22,11 +44,46 @@ class EnvironmentSensorManager:
         self.averages_file = config_paths.LOG_SENSOR_ENV_AVERAGES_PATH
         self.logging_enabled = True
         self.log_interval = 5
-        self.buffer = {}
+        self.interval_override = None      # Satt via set_log_interval(), gjelder alle sensorer
+        self.jitter_sec = 0.0
+        self.missed_tolerance_sec = 1.0
+        self.rollup_retention = {}
+        self.status_min_interval_sec = 30.0
+        # Siste måling per sensor. Dict-en byttes ut (aldri endret) ved hver ny verdi, så
+        # lesere kan bruke den uten lås; latest_seq økes bare når en verdi faktisk endres.
+        self.latest = {}
+        self.latest_seq = 0
+        self._latest_lock = threading.Lock()
+        self._status_written_seq = 0
+        self._status_written_at = 0.0
+        self._status_timer = None           # Skriver utsatt endring når intervallet er gått
+        self._status_write_lock = threading.Lock()
+        self.timeseries = get_timeseries_store()
         self.load_sensors()
         self.load_config()
-        self.start_logging_loop()
-        self.last_hour = datetime.now().hour
+        self._load_status_file()
+        self.rollups = RollupEngine(self.rollup_retention, on_close=self._on_rollup_closed)
+        self._subscribers = []              # (callback, requires_logging)
+        self._subscribers_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+
+        # Planlegger: heap av (frist, seq, sensor_id, basisfrist)
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._sensor_stats = {
+            sensor.id: {"reads": 0, "failures": 0, "missed": 0, "max_lateness_ms": 0.0}
+            for sensor in self.sensors
+        }
+        self._schedule_all(time.monotonic())
+
+        # Innebygde forbrukere: statusfil alltid, historikk bare når logging er aktivert
+        self.subscribe(lambda readings, ts: self.save_latest(readings))
+        self.subscribe(self.rollups.add_readings, requires_logging=True)
+        self.subscribe(lambda readings, ts: self.timeseries.append_readings(readings, ts), requires_logging=True)
+        self.subscribe(self._update_metrics)
+        _metrics.register_collector(self._collect_metrics)
 
     def load_sensors(self):
         try:
@@ -42,7 +99,6 @@ class EnvironmentSensorManager:
                     try:
                         self.sensors.append(cls(sensor_conf))
                         self.status_logger.info(f"Sensor '{sensor_conf['id']}' ({sensor_type}) lastet")
-                        self.buffer[sensor_conf['id']] = []
                     except Exception as e:
                         self.status_logger.error(f"Feil ved sensor '{sensor_conf['id']}': {e}")
                 else:
@@ -57,35 +113,159 @@ class EnvironmentSensorManager:
             self.log_interval = int(3600 / avg_config.get("samples_per_hour", 15))
             self.day_start = avg_config.get("day_range", {}).get("start", "06:00")
             self.day_end = avg_config.get("day_range", {}).get("end", "21:00")
+            self.rollup_retention = config.get("rollups", {}).get("retention", {})
+            scheduler_config = config.get("scheduler", {})
+            self.jitter_sec = float(scheduler_config.get("jitter_sec", 0.0))
+            self.missed_tolerance_sec = float(scheduler_config.get("missed_tolerance_sec", 1.0))
+            self.status_min_interval_sec = float(config.get("status_file", {}).get("min_interval_sec", 30))
             self.status_logger.info(f"Averaging config lastet. log_interval: {self.log_interval}s")
         except Exception as e:
             self.status_logger.error(f"Feil ved lasting av averaging config: {e}")
 
+    def subscribe(self, callback, requires_logging=False):
+        """
+        Registrerer en forbruker som kalles med (readings, ts) etter hver leserunde.
+        Med requires_logging hoppes forbrukeren over når logging er deaktivert.
+        """
+        with self._subscribers_lock:
+            self._subscribers.append((callback, requires_logging))
+
+    def unsubscribe(self, callback):
+        with self._subscribers_lock:
+            self._subscribers = [(cb, req) for cb, req in self._subscribers if cb is not callback]
+
+    def publish(self, readings, ts):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for callback, requires_logging in subscribers:
+            if requires_logging and not self.logging_enabled:
+                continue
+            try:
+                callback(readings, ts)
+            except Exception as e:
+                self.status_logger.error(f"Feil i sensorabonnent {getattr(callback, '__qualname__', callback)}: {e}")
+
     def start_logging_loop(self):
-        threading.Thread(target=self._logging_loop, daemon=True).start()
+        """
+        Starter lesetråden. Gjør ingenting hvis den allerede kjører.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._logging_loop, name="env_sensor_hub", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """
+        Stopper lesetråden (pågående lesing fullføres) og skriver ventende endringer til statusfilen.
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        with self._latest_lock:
+            timer, self._status_timer = self._status_timer, None
+        if timer:
+            timer.cancel()
+        self._write_status(force=True)
+        self.status_logger.info("Sensormanager stoppet")
+
+    def get_interval(self, sensor):
+        return self.interval_override or getattr(sensor, "interval_sec", None) or self.log_interval
+
+    def _jitter(self):
+        return random.uniform(0, self.jitter_sec) if self.jitter_sec > 0 else 0.0
+
+    def _schedule_all(self, now):
+        """
+        Bygger heapen på nytt: alle sensorer leses snarest, spredt med jitter.
+        Kalles med self._cond holdt (eller før tråden er startet).
+        """
+        self._heap = [(now + self._jitter(), next(self._seq), sensor.id, now) for sensor in self.sensors]
+        heapq.heapify(self._heap)
 
     def _logging_loop(self):
+        sensors = {sensor.id: sensor for sensor in self.sensors}
         while True:
-            now = datetime.now()
-            if self.logging_enabled:
-                data = self.read_all()
-                self.save_latest(data)
-                self.update_buffer(data)
-            if now.hour != self.last_hour:
-                self.calculate_hourly_averages()
-                self.last_hour = now.hour
-            time.sleep(self.log_interval)
-
-    def update_buffer(self, data):
-        now = datetime.now()
-        for sensor_id, values in data.items():
-            entry = {
-                "temperature": values["temperature"],
-                "humidity": values["humidity"],
-                "pressure": values["pressure"],
-                "timestamp": now.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            self.buffer.setdefault(sensor_id, []).append(entry)
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+
+                # Hent alle sensorer som er forfalt, og planlegg neste frist før lesing
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    deadline, _, sensor_id, base = heapq.heappop(self._heap)
+                    sensor = sensors[sensor_id]
+                    interval = self.get_interval(sensor)
+                    stats = self._sensor_stats[sensor_id]
+                    lateness = now - deadline
+                    stats["max_lateness_ms"] = max(stats["max_lateness_ms"], round(lateness * 1000, 1))
+                    if lateness > self.missed_tolerance_sec:
+                        stats["missed"] += 1
+
+                    next_base = base + interval
+                    if next_base <= now:
+                        # Ligger mer enn ett intervall etter – hopp over tapte runder i stedet for å ta dem igjen
+                        next_base = now + interval
+                    heapq.heappush(self._heap, (next_base + self._jitter(), next(self._seq), sensor_id, next_base))
+                    due.append(sensor)
+
+            readings = {}
+            for sensor in due:
+                data = sensor.read_data()
+                stats = self._sensor_stats[sensor.id]
+                if data:
+                    stats["reads"] += 1
+                    readings[sensor.id] = data
+                else:
+                    stats["failures"] += 1
+            if readings:
+                self.publish(readings, time.time())
+
+    def _update_metrics(self, readings, ts):
+        for sensor_id, values in readings.items():
+            ENV_READINGS.labels(sensor=sensor_id).inc()
+            for metric, gauge in ENV_GAUGES.items():
+                if values.get(metric) is not None:
+                    gauge.labels(sensor=sensor_id).set(values[metric])
+
+    def _collect_metrics(self):
+        sensors = self.get_scheduler_stats()["sensors"]
+        return [
+            ("garage_env_read_failures_total", "counter", "Antall mislykkede sensorlesinger", [
+                ({"sensor": sensor_id}, stats["failures"]) for sensor_id, stats in sensors.items()
+            ]),
+            ("garage_env_missed_deadlines_total", "counter", "Antall lesinger startet etter fristen", [
+                ({"sensor": sensor_id}, stats["missed"]) for sensor_id, stats in sensors.items()
+            ]),
+        ]
+
+    def get_scheduler_stats(self):
+        """
+        Returnerer intervall, tid til neste lesing og tellere (inkl. tapte frister) per sensor.
+        """
+        now = time.monotonic()
+        with self._cond:
+            next_due = {sensor_id: deadline - now for deadline, _, sensor_id, _ in self._heap}
+            sensors = {}
+            for sensor in self.sensors:
+                sensors[sensor.id] = {
+                    "interval_sec": self.get_interval(sensor),
+                    "next_due_in_sec": round(max(next_due.get(sensor.id, 0.0), 0.0), 2),
+                    **self._sensor_stats[sensor.id],
+                }
+        return {
+            "jitter_sec": self.jitter_sec,
+            "missed_tolerance_sec": self.missed_tolerance_sec,
+            "interval_override": self.interval_override,
+            "sensors": sensors,
+        }
 
     def read_all(self):
         result = {}
@@ -95,14 +275,67 @@ class EnvironmentSensorManager:
                 result[sensor.id] = data
         return result
 
-    def save_latest(self, data):
+    def _load_status_file(self):
+        """
+        Starter med verdiene fra forrige kjøring, slik at /latest har data før første lesing.
+        """
         try:
-            os.makedirs(os.path.dirname(self.status_file), exist_ok=True)
-            with open(self.status_file, "w") as f:
-                json.dump(data, f, indent=2)
-            self.status_logger.debug(f"Lagret siste sensorverdier til {self.status_file}")
-        except Exception as e:
-            self.status_logger.error(f"Feil ved skriving av sensorstatus: {e}")
+            with open(self.status_file, "r") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data:
+                self.latest = data
+                self.latest_seq = self._status_written_seq = 1
+        except (OSError, ValueError):
+            pass
+
+    def save_latest(self, data):
+        """
+        Oppdaterer siste måling i minnet. Statusfilen skrives atomisk, bare når noe er endret,
+        og høyst hvert status_min_interval_sec; en utsatt endring skrives av en timer når
+        intervallet er gått (og ved stop()).
+        """
+        with self._latest_lock:
+            if any(self.latest.get(sensor_id) != values for sensor_id, values in data.items()):
+                # Sensorene leses hver for seg – behold siste måling fra alle
+                self.latest = {**self.latest, **data}
+                self.latest_seq += 1
+        self._write_status()
+
+    def _write_status(self, force=False):
+        with self._status_write_lock:
+            with self._latest_lock:
+                latest, seq = self.latest, self.latest_seq
+                if seq == self._status_written_seq:
+                    return
+                now = time.monotonic()
+                wait = self.status_min_interval_sec - (now - self._status_written_at)
+                if wait > 0 and not force:
+                    if self._status_timer is None:
+                        self._status_timer = threading.Timer(wait, self._on_status_timer)
+                        self._status_timer.daemon = True
+                        self._status_timer.start()
+                    return
+                self._status_written_seq = seq
+                self._status_written_at = now
+
+            try:
+                os.makedirs(os.path.dirname(self.status_file), exist_ok=True)
+                atomic_write_json(self.status_file, latest, indent=2)
+                self.status_logger.debug(f"Lagret siste sensorverdier til {self.status_file}")
+            except Exception as e:
+                self.status_logger.error(f"Feil ved skriving av sensorstatus: {e}")
+
+    def _on_status_timer(self):
+        with self._latest_lock:
+            self._status_timer = None
+        self._write_status()
+
+    def get_latest(self):
+        """
+        Returnerer (seq, målinger per sensor) fra minnet. Dict-en skal ikke endres av kalleren.
+        """
+        with self._latest_lock:
+            return self.latest_seq, self.latest
 
     def set_logging_enabled(self, enabled: bool):
         self.logging_enabled = enabled
@@ -112,39 +345,74 @@ class EnvironmentSensorManager:
         return self.logging_enabled
 
     def set_log_interval(self, seconds: int):
-        self.log_interval = seconds
+        """
+        Overstyrer leseintervallet for alle sensorer og planlegger neste lesing på nytt.
+        Kaster ValueError for intervaller som ikke er positive (ville gitt lesing i tett løkke).
+        """
+        if isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or seconds <= 0:
+            raise ValueError(f"Ugyldig loggeintervall: {seconds!r}")
+        with self._cond:
+            self.log_interval = seconds
+            self.interval_override = seconds
+            self._schedule_all(time.monotonic())
+            self._cond.notify()
         self.status_logger.info(f"Oppdatert loggeintervall til {seconds} sekunder")
 
-    def calculate_hourly_averages(self):
-        now = datetime.now()
-        hour_summary = []
-        for sensor_id, samples in self.buffer.items():
-            if not samples:
-                continue
-            avg_temp = sum(s["temperature"] for s in samples) / len(samples)
-            avg_hum = sum(s["humidity"] for s in samples) / len(samples)
-            avg_press = sum(s["pressure"] for s in samples) / len(samples)
-            day_period = "natt"
-            day_start = datetime.strptime(self.day_start, "%H:%M").time()
-            day_end = datetime.strptime(self.day_end, "%H:%M").time()
-            if day_start <= now.time() < day_end:
-                day_period = "dag"
-            entry = {
-                "timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
-                "sensor": sensor_id,
-                "avg_temperature": round(avg_temp, 2),
-                "avg_humidity": round(avg_hum, 2),
-                "avg_pressure": round(avg_press, 2),
-                "periode": day_period
-            }
-            hour_summary.append(entry)
-            self.buffer[sensor_id] = []
+    def _on_rollup_closed(self, sensor_id, resolution, entry):
+        """
+        Kalles av RollupEngine når en periode lukkes. Lukkede timer skrives til
+        sensor_env_averages.json i samme format som før.
+        """
+        if resolution == "hour":
+            self.write_hourly_average(entry)
+
+    def write_hourly_average(self, entry):
+        metrics = entry["metrics"]
+        if not metrics["temperature"]["count"]:
+            return
+        start = datetime.fromtimestamp(entry["epoch"])
+        day_start = datetime.strptime(self.day_start, "%H:%M").time()
+        day_end = datetime.strptime(self.day_end, "%H:%M").time()
+        day_period = "dag" if day_start <= start.time() < day_end else "natt"
+        item = {
+            "timestamp": datetime.fromtimestamp(entry["epoch"] + 3600).strftime("%Y-%m-%d %H:%M:%S"),
+            "sensor": entry["sensor"],
+            "avg_temperature": round(metrics["temperature"]["mean"], 2),
+            "avg_humidity": round(metrics["humidity"]["mean"], 2),
+            "avg_pressure": round(metrics["pressure"]["mean"], 2),
+            "periode": day_period
+        }
 
         try:
             os.makedirs(os.path.dirname(self.averages_file), exist_ok=True)
             with open(self.averages_file, "a") as f:
-                for item in hour_summary:
-                    f.write(json.dumps(item) + "\n")
-            self.status_logger.info(f"Lagret timelig snitt for {len(hour_summary)} sensorer")
+                f.write(json.dumps(item) + "\n")
+            self.status_logger.info(f"Lagret timesnitt for {entry['sensor']} ({entry['start']})")
         except Exception as e:
             self.status_logger.error(f"Feil ved skriving av snitt: {e}")
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_environment_manager():
+    """
+    Returnerer delt EnvironmentSensorManager. Opprettes og startes ved første kall.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = EnvironmentSensorManager()
+            _manager.start_logging_loop()
+        return _manager
+
+
+def stop_environment_manager():
+    """
+    Stopper den delte sensormanageren hvis den er opprettet (oppretter den aldri).
+    """
+    with _manager_lock:
+        manager = _manager
+    if manager is not None:
+        manager.stop()
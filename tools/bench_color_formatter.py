@@ -0,0 +1,90 @@
+# Fil: tools/bench_color_formatter.py
+
+"""
+Mikrobenchmark: gammel regex-basert ColorFormatter mot den forhåndsberegnede i unified_logger.
+Kjøres fra prosjektroten:
+    python -m tools.bench_color_formatter [antall]
+"""
+
+import logging
+import re
+import sys
+import timeit
+
+from utils.logging.unified_logger import CONSOLE_FORMAT, ColorFormatter
+
+DATEFMT = "%Y-%m-%d %H:%M:%S"
+
+
+class LegacyColorFormatter(logging.Formatter):
+    """Kopi av den opprinnelige formatteren (før forhåndsberegning), kun for sammenligning."""
+    LEVEL_COLORS = ColorFormatter.LEVEL_COLORS
+    CAT_COLOR = ColorFormatter.CAT_COLOR
+    RESET = ColorFormatter.RESET
+
+    def format(self, record):
+        msg = super().format(record)
+        for level, color in self.LEVEL_COLORS.items():
+            tag = f"[{level}]"
+            msg = msg.replace(tag, f"{color}{tag}{self.RESET}")
+        tags = list(re.finditer(r"\[[a-zA-Z0-9_]+\]", msg))
+        for i, match in enumerate(tags):
+            if any(match.group(0) == f"[{lvl}]" for lvl in self.LEVEL_COLORS):
+                if i + 1 < len(tags):
+                    cat_tag = tags[i + 1].group(0)
+                    if cat_tag != "[BOOTSTRAP]":
+                        msg = msg.replace(cat_tag, f"{self.CAT_COLOR}{cat_tag}{self.RESET}", 1)
+                break
+        return msg
+
+
+def _make_records():
+    records = []
+    for level, category in [
+        (logging.DEBUG, "environment"),
+        (logging.INFO, "port_activity"),
+        (logging.WARNING, "system"),
+        (logging.ERROR, "garage_controller"),
+    ]:
+        record = logging.LogRecord(
+            "GarageController", level, __file__, 0,
+            "Sensor-endring: %s (%s) GPIO %d = %d", ("port1", "closed", 17, 1), None,
+        )
+        record.category = category
+        records.append(record)
+    return records
+
+
+def _bench(formatter, records, number):
+    def run():
+        for record in records:
+            formatter.format(record)
+    seconds = min(timeit.repeat(run, number=number, repeat=5))
+    return seconds / (number * len(records)) * 1e6
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    records = _make_records()
+
+    formatters = [
+        ("gammel (regex)", LegacyColorFormatter(CONSOLE_FORMAT, datefmt=DATEFMT)),
+        ("ny (farger)", ColorFormatter(CONSOLE_FORMAT, datefmt=DATEFMT, use_color=True)),
+        ("ny (uten farger, ikke TTY)", ColorFormatter(CONSOLE_FORMAT, datefmt=DATEFMT, use_color=False)),
+    ]
+
+    # Samme synlige tekst: fjern ANSI-koder og sammenlign
+    strip = re.compile(r"\x1b\[[0-9;]*m").sub
+    legacy, new = formatters[0][1], formatters[1][1]
+    for record in records:
+        assert strip("", legacy.format(record)) == strip("", new.format(record)), "Ulik utskrift"
+
+    baseline = None
+    for name, formatter in formatters:
+        usec = _bench(formatter, records, number)
+        baseline = baseline or usec
+        print(f"{name:<28} {usec:7.2f} µs/linje  ({baseline / usec:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
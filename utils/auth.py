@@ -1,21 +1,135 @@
-from utils.logging.unified_logger import get_logger
 # utils/auth.py
-import os
-import json
-from flask import request, jsonify
+
+"""
+Token-autentisering for API-et.
+
+config_auth.json leses via den delte config-cachen (utils.config_loader.get_config), som
+stat-er filen maks hvert RELOAD_CHECK_INTERVAL sekund og beholder forrige gyldige versjon
+hvis filen ikke kan leses. Tokentabellen bygges bare på nytt når cachen gir et nytt snapshot.
+
+Godkjente nøkler:
+- "token" (toppnivå): den opprinnelige API-tokenen, som token_required alltid har sjekket.
+  Registreres som bruker "default".
+- "users.<navn>.token": navngitte tokens (tidligere kun godtatt av check_token).
+- "webhook_key" (entall, slik config_auth.json faktisk er skrevet) og listen "webhook_keys".
+Alle sammenligninger gjøres i konstant tid.
+"""
+
+import hmac
+import threading
+import time
 from functools import wraps
 
+from flask import request, jsonify, g
+
 from config.config_paths import CONFIG_AUTH_PATH
+from utils.config_loader import get_config
+from utils.logging.unified_logger import get_logger
+
+logger = get_logger("auth", category="api")
+
+# Sekunder mellom hver stat() av config_auth.json
+RELOAD_CHECK_INTERVAL = 2.0
+
+
+class _AuthCache:
+    def __init__(self, path, check_interval):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._parsed = (None, {}, ())   # (snapshot, navn -> token (bytes), webhook-nøkler (bytes))
+        self._retry_at = 0.0            # Neste forsøk hvis filen aldri er lest
+        self.stats = {"hits": 0, "misses": 0, "reloads": 0, "errors": 0, "accepted": 0, "rejected": 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _current(self):
+        """
+        Returnerer (snapshot, tokens, webhook_keys) for gjeldende versjon av filen.
+        Ved lesefeil beholder get_config forrige snapshot; er filen aldri lest,
+        godkjennes ingenting og nytt forsøk gjøres etter check_interval.
+        """
+        parsed = self._parsed
+        now = time.monotonic()
+        if parsed[0] is None and now < self._retry_at:
+            self._count("hits")
+            return parsed
+        try:
+            snapshot = get_config(self.path, revalidate_ms=self.check_interval * 1000)
+        except (OSError, ValueError) as e:
+            with self._lock:
+                self.stats["misses"] += 1
+                self.stats["errors"] += 1
+                self._retry_at = now + self.check_interval
+            logger.error(f"Kunne ikke lese {self.path}: {e}")
+            return parsed
+
+        if snapshot is parsed[0]:
+            self._count("hits")
+            return parsed
+        with self._lock:
+            self.stats["misses"] += 1
+            if snapshot is not self._parsed[0]:
+                self._parsed = self._build(snapshot)
+                self.stats["reloads"] += 1
+            return self._parsed
+
+    def _build(self, config):
+        tokens = {}
+        if config.get("token"):
+            tokens["default"] = config["token"].encode()
+        for name, user in config.get("users", {}).items():
+            if isinstance(user, dict) and user.get("token"):
+                tokens[name] = user["token"].encode()
+
+        webhook_keys = list(config.get("webhook_keys", []))
+        if config.get("webhook_key"):
+            webhook_keys.append(config["webhook_key"])
 
-CONFIG_AUTH_PATH = os.path.join("config", "config_auth.json")
+        logger.info(f"Autentiseringsconfig lastet: {len(tokens)} token(s), {len(webhook_keys)} webhook-nøkkel(er)")
+        return config, tokens, tuple(key.encode() for key in webhook_keys)
+
+    def get_config(self):
+        return self._current()[0] or {}
+
+    def match_token(self, candidate):
+        """
+        Returnerer navnet på token som matcher, ellers None.
+        Alle tokens sammenlignes, slik at tidsbruken ikke avslører hvilken som traff.
+        """
+        tokens = self._current()[1]
+        candidate = candidate.encode()
+        matched = None
+        for name, token in tokens.items():
+            if hmac.compare_digest(candidate, token) and matched is None:
+                matched = name
+        self._count("accepted" if matched else "rejected")
+        return matched
+
+    def match_webhook_key(self, candidate):
+        webhook_keys = self._current()[2]
+        candidate = candidate.encode()
+        matched = False
+        for key in webhook_keys:
+            matched |= hmac.compare_digest(candidate, key)
+        self._count("accepted" if matched else "rejected")
+        return matched
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+
+_auth_cache = _AuthCache(CONFIG_AUTH_PATH, RELOAD_CHECK_INTERVAL)
 
 
 def load_auth_config():
-    try:
-        with open(CONFIG_AUTH_PATH) as f:
-            return json.load(f)
-    except:
-        return {}
+    """
+    Returnerer innholdet i config_auth.json (uforanderlig øyeblikksbilde fra minnet).
+    """
+    return _auth_cache.get_config()
 
 
 def check_token():
@@ -24,38 +138,39 @@ def check_token():
     - Bare token
     - Bearer token
     """
-    config = load_auth_config()
     header = request.headers.get("Authorization", "")
     token = header.replace("Bearer ", "").strip()
-    allowed_tokens = [u.get("token") for u in config.get("users", {}).values()]
-    return token in allowed_tokens
-
+    return bool(token) and _auth_cache.match_token(token) is not None
 
 
 def check_webhook_key():
     """
     Tillater webhook-kall med /route?key=webhook-key
     """
-    config = load_auth_config()
     key = request.args.get("key")
-    return key in config.get("webhook_keys", [])
+    return bool(key) and _auth_cache.match_webhook_key(key)
+
 
 def load_token():
-    try:
-        with open(CONFIG_AUTH_PATH) as f:
-            config = json.load(f)
-        return config.get("token")
-    except:
-        return None
+    return load_auth_config().get("token")
+
+
+def get_auth_stats():
+    """
+    Returnerer tellere for cache (hits/misses/reloads) og godkjente/avviste forespørsler.
+    """
+    return _auth_cache.get_stats()
+
 
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = load_token()
         auth_header = request.headers.get("Authorization")
         if not auth_header or not auth_header.startswith("Bearer "):
             return jsonify({"error": "Missing or invalid token"}), 401
-        if auth_header.split(" ")[1] != token:
+        user = _auth_cache.match_token(auth_header[len("Bearer "):].strip())
+        if user is None:
             return jsonify({"error": "Unauthorized"}), 403
+        g.auth_user = user
         return f(*args, **kwargs)
     return decorated
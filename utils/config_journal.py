@@ -0,0 +1,209 @@
+# utils/config_journal.py
+
+"""
+Write-behind-persistens for runtime-data i config_system.json.
+
+Endringer (status, timing) legges i minnet og skrives som kompakte JSON-linjer til en
+journalfil av en bakgrunnstråd. Flere oppdateringer av samme nøkkel innenfor ett
+flush-intervall slås sammen. Hele dokumentet skrives atomisk (temp-fil + rename) med
+jevne mellomrom og ved shutdown, og journalen tømmes etter hvert sjekkpunkt.
+Ved oppstart spilles journalen av på dokumentet lest fra disk.
+Endringer meldes til config-cachen (config_loader.mark_config_dirty), slik at
+get_config(config_path) gir minneversjonen og ikke en eldre kopi på disk. Snapshotet
+bygges først når noen leser det, så update() koster ikke en kopi av hele dokumentet.
+"""
+
+import copy
+import json
+import os
+import threading
+import time
+
+from utils.config_loader import freeze, mark_config_dirty, publish_config
+from utils.file_utils import atomic_write_json
+from utils.logging.unified_logger import get_logger
+
+logger = get_logger("config_journal", category="system")
+
+
+class ConfigJournal:
+    def __init__(self, config_path, journal_path, document, flush_interval=1.0, checkpoint_interval=300.0):
+        self.config_path = config_path
+        self.journal_path = journal_path
+        self.document = document            # Levende dict (eies av GarageController)
+        self.flush_interval = flush_interval
+        self.checkpoint_interval = checkpoint_interval
+
+        self.lock = threading.RLock()          # Kun minneoperasjoner; holdes aldri under disk-I/O
+        self._io_lock = threading.Lock()        # Serialiserer journal- og sjekkpunktskriving
+        self._pending = {}                  # nøkkelsti (tuple) -> siste verdi (sammenslått)
+        self._dirty = False                 # Endringer siden siste sjekkpunkt
+        self._cache_stale = False           # Endringer som config-cachen ikke har sett
+        self._version = 0                   # Økes ved hver update()
+        self._last_checkpoint = time.monotonic()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self.stats = {"updates": 0, "records_written": 0, "flushes": 0, "checkpoints": 0, "errors": 0}
+
+    def replay(self):
+        """
+        Spiller av journalen på dokumentet. Kalles før start().
+        Ufullstendige linjer (krasj midt i skriving) hoppes over.
+        Returnerer antall poster som ble brukt.
+        """
+        if not os.path.exists(self.journal_path):
+            return 0
+
+        applied = 0
+        with self.lock, open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self._set(tuple(record["k"]), record["v"])
+                    applied += 1
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"Hopper over ugyldig journallinje: {line.strip()[:80]}")
+            self._dirty = self._dirty or applied > 0
+
+        if applied:
+            logger.info(f"Spilte av {applied} journalposter fra {self.journal_path}")
+        return applied
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        with self.lock:
+            publish_config(self.config_path, self.document)
+        self._thread = threading.Thread(target=self._run, name="config_journal", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Journal startet (flush {self.flush_interval}s, sjekkpunkt {self.checkpoint_interval}s)"
+        )
+
+    def stop(self):
+        """
+        Stopper bakgrunnstråden og skriver et siste sjekkpunkt.
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 2)
+        self.checkpoint()
+
+    def update(self, keys, value):
+        """
+        Setter verdi på nøkkelsti (f.eks. ("port1", "timing", "open")) i dokumentet
+        og legger den i kø for journalen. Blokkerer aldri på disk-I/O.
+        Kalleren gir fra seg verdien og skal ikke endre den etterpå.
+        """
+        keys = tuple(keys)
+        with self.lock:
+            self._set(keys, value)
+            self._pending[keys] = value
+            self._dirty = True
+            self._version += 1
+            self.stats["updates"] += 1
+            notify_cache = not self._cache_stale
+            self._cache_stale = True
+        if notify_cache:
+            mark_config_dirty(self.config_path, self._cache_snapshot)
+
+    def flush(self):
+        """
+        Skriver ventende poster til journalfilen (én linje per nøkkelsti).
+        Batchen byttes ut under låsen; selve skrivingen og fsync skjer uten den,
+        slik at update() (GPIO-callbacken) aldri venter på SD-kortet.
+        """
+        with self._io_lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        # Kalles med self._io_lock holdt, så batcher skrives i samme rekkefølge som de ble tatt ut
+        with self.lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+
+        now = round(time.time(), 3)
+        lines = [
+            json.dumps({"t": now, "k": list(keys), "v": value}, separators=(",", ":"), ensure_ascii=False)
+            for keys, value in batch.items()
+        ]
+        try:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            with self.lock:
+                self.stats["errors"] += 1
+                # Behold batchen til neste forsøk, men ikke over nyere verdier
+                for keys, value in batch.items():
+                    self._pending.setdefault(keys, value)
+            logger.error(f"Kunne ikke skrive til journal {self.journal_path}: {e}")
+            return
+        with self.lock:
+            self.stats["records_written"] += len(lines)
+            self.stats["flushes"] += 1
+
+    def checkpoint(self):
+        """
+        Skriver hele dokumentet atomisk til config-filen og tømmer journalen.
+        Dokumentet kopieres under låsen; skrivingen skjer på kopien.
+        """
+        with self._io_lock:
+            self._flush_locked()
+            with self.lock:
+                if not self._dirty:
+                    return
+                document = copy.deepcopy(self.document)
+                version = self._version
+                self._dirty = False
+            try:
+                atomic_write_json(self.config_path, document, indent=4)
+                # Journalen er nå dekket av sjekkpunktet (senere endringer ligger fortsatt i _pending)
+                open(self.journal_path, "w").close()
+            except Exception as e:
+                with self.lock:
+                    self._dirty = True
+                    self.stats["errors"] += 1
+                logger.error(f"Kunne ikke skrive sjekkpunkt til {self.config_path}: {e}")
+                return
+
+            publish_config(self.config_path, document)      # Ny stat-nøkkel for filen
+            with self.lock:
+                self._last_checkpoint = time.monotonic()
+                self.stats["checkpoints"] += 1
+                # Endringer etter kopien må fortsatt bygges inn i cachen
+                changed = self._version != version
+                if changed:
+                    self._cache_stale = True
+            if changed:
+                mark_config_dirty(self.config_path, self._cache_snapshot)
+            logger.debug(f"Sjekkpunkt skrevet til {self.config_path}")
+
+    def _cache_snapshot(self):
+        # Kalles fra get_config() i leserens tråd
+        with self.lock:
+            self._cache_stale = False
+            return freeze(self.document)
+
+    def get_stats(self):
+        with self.lock:
+            return {**self.stats, "pending": len(self._pending), "dirty": self._dirty}
+
+    def _set(self, keys, value):
+        node = self.document
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = value
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+                if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+                    self.checkpoint()
+            except Exception as e:
+                logger.error(f"Uventet feil i journal-tråd: {e}")
@@ -1,8 +1,14 @@
 from utils.logging.unified_logger import get_logger
+import copy
 import json
 import os
+import threading
+import time
 from config import config_paths as paths
 from config import config_paths as paths
+from utils.metrics import get_registry
+
+logger = get_logger("config_loader", category="system")
 
 
 def _load_json_file(path):
@@ -47,3 +53,178 @@ def load_portlogic_config():
             raise KeyError(f"Mangler '{key}' i portlogikk-konfig")
 
     return config
+
+
+# --- Delt config-cache ---
+# get_config() gir uforanderlige øyeblikksbilder som deles av alle lesere i prosessen.
+# Filen stat-es (mtime, størrelse, inode) høyst hvert revalidate_ms; bare ved endring leses
+# og parses den på nytt. Eieren av et levende dokument (f.eks. ConfigJournal for
+# config_system.json) publiserer endringer med publish_config(), slik at lesere ser
+# minneversjonen i stedet for en eldre kopi på disk. Ved hyppige endringer kan eieren i stedet
+# melde dokumentet som endret med mark_config_dirty(); snapshotet bygges da først ved neste
+# get_config(), og bare én gang uansett hvor mange endringer som kom i mellomtiden.
+
+DEFAULT_REVALIDATE_MS = 500
+
+
+class FrozenDict(dict):
+    """
+    dict som ikke kan endres. JSON-serialiseres som vanlig dict;
+    copy.deepcopy()/copy() gir en vanlig (muterbar) kopi.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Config-øyeblikksbilder kan ikke endres – ta en kopi med copy.deepcopy()")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = __ior__ = _readonly
+
+    def __deepcopy__(self, memo):
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+def freeze(value):
+    """Rekursiv kopi der dict blir FrozenDict og list blir tuple."""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class _CacheEntry:
+    __slots__ = ("snapshot", "stat_key", "checked_at")
+
+    def __init__(self, snapshot, stat_key, checked_at):
+        self.snapshot = snapshot
+        self.stat_key = stat_key
+        self.checked_at = checked_at
+
+
+_cache = {}
+_cache_sources = {}     # path -> kallbar som gir nytt snapshot (satt av mark_config_dirty)
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "revalidations": 0, "published": 0, "errors": 0}
+
+
+def get_config(path, revalidate_ms=DEFAULT_REVALIDATE_MS):
+    """
+    Returnerer uforanderlig øyeblikksbilde (FrozenDict) av JSON-filen.
+    Kaster FileNotFoundError/ValueError bare hvis filen aldri er lest; er en gyldig versjon
+    allerede i cachen, beholdes den ved lesefeil (logges).
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        source = _cache_sources.pop(path, None)
+    if source is not None:
+        return _build_from_source(path, source, now)
+
+    with _cache_lock:
+        entry = _cache.get(path)
+        if entry is not None and (now - entry.checked_at) * 1000 < revalidate_ms:
+            _cache_stats["hits"] += 1
+            return entry.snapshot
+
+        try:
+            key = _stat_key(path)
+            if entry is not None:
+                _cache_stats["revalidations"] += 1
+                if key == entry.stat_key:
+                    entry.checked_at = now
+                    _cache_stats["hits"] += 1
+                    return entry.snapshot
+
+            _cache_stats["misses"] += 1
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot = freeze(json.load(f))
+        except (OSError, ValueError) as e:
+            if entry is None:
+                raise
+            _cache_stats["errors"] += 1
+            entry.checked_at = now
+            logger.warning(f"Kunne ikke lese {path} på nytt, bruker forrige versjon: {e}")
+            return entry.snapshot
+
+        _cache[path] = _CacheEntry(snapshot, key, now)
+        return snapshot
+
+
+def publish_config(path, data):
+    """
+    Legger et nytt øyeblikksbilde av data i cachen for path (f.eks. etter endring i minnet).
+    Kalles av den som eier dokumentet; data fryses (kopieres), så kalleren kan fortsette å endre sitt.
+    Stat-nøkkelen tas fra filen nå, slik at snapshotet gjelder til filen endres av noen andre.
+    Returnerer øyeblikksbildet.
+    """
+    snapshot = freeze(data)
+    try:
+        key = _stat_key(path)
+    except OSError:
+        key = None
+    with _cache_lock:
+        _cache[path] = _CacheEntry(snapshot, key, time.monotonic())
+        _cache_stats["published"] += 1
+    return snapshot
+
+
+def mark_config_dirty(path, source):
+    """
+    Melder at eierens dokument for path er endret uten å bygge snapshot nå.
+    source er en kallbar uten argumenter som returnerer et frosset snapshot (se freeze);
+    den kalles fra neste get_config(path), uten at cache-låsen holdes.
+    """
+    with _cache_lock:
+        _cache_sources[path] = source
+
+
+def _build_from_source(path, source, now):
+    snapshot = source()
+    with _cache_lock:
+        entry = _cache.get(path)
+        if entry is not None:
+            key = entry.stat_key        # Filen er ikke skrevet; bare minneversjonen er endret
+        else:
+            try:
+                key = _stat_key(path)
+            except OSError:
+                key = None
+        _cache[path] = _CacheEntry(snapshot, key, now)
+        _cache_stats["published"] += 1
+    return snapshot
+
+
+def invalidate_config(path=None):
+    """Fjerner path (eller alt) fra cachen, slik at neste get_config leser fra disk."""
+    with _cache_lock:
+        if path is None:
+            _cache.clear()
+            _cache_sources.clear()
+        else:
+            _cache.pop(path, None)
+            _cache_sources.pop(path, None)
+
+
+def get_config_cache_stats():
+    with _cache_lock:
+        return {**_cache_stats, "entries": len(_cache)}
+
+
+def _collect_metrics():
+    stats = get_config_cache_stats()
+    return [
+        ("garage_config_cache_lookups_total", "counter", "Oppslag i config-cachen", [
+            ({"result": "hit"}, stats["hits"]),
+            ({"result": "miss"}, stats["misses"]),
+        ]),
+    ]
+
+
+get_registry().register_collector(_collect_metrics)
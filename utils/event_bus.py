@@ -0,0 +1,136 @@
+# utils/event_bus.py
+
+"""
+Enkel publish/subscribe-fan-out i prosessen.
+
+Hver abonnent får sin egen begrensede kø; er køen full, kastes eldste hendelse
+(treg klient skal aldri blokkere publisereren, f.eks. pigpio-callback-tråden).
+De siste hendelsene holdes i en liten ring slik at klienter kan gjenoppta
+strømmen med Last-Event-ID.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+
+from utils.logging.unified_logger import get_logger
+
+logger = get_logger("event_bus", category="system")
+
+
+class Subscription:
+    def __init__(self, bus, maxsize):
+        self.bus = bus
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.start_id = 0       # Siste hendelses-ID da abonnementet ble opprettet
+
+    def get(self, timeout=None):
+        """
+        Returnerer neste hendelse, eller None hvis ingenting kom innen timeout.
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def _offer(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Kast eldste hendelse for å gi plass til den nyeste
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped += 1
+            self.queue.put_nowait(event)
+
+
+class EventBus:
+    def __init__(self, name, ring_size=100, queue_size=50):
+        self.name = name
+        self.queue_size = queue_size
+        self._ring = deque(maxlen=ring_size)
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, event_type, data):
+        """
+        Publiserer en hendelse til alle abonnenter. Blokkerer aldri.
+        """
+        with self._lock:
+            event = {
+                "id": next(self._ids),
+                "type": event_type,
+                "data": data,
+                "timestamp": time.time(),
+            }
+            self._ring.append(event)
+            self.published += 1
+            for subscription in self._subscribers:
+                subscription._offer(event)
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """
+        Oppretter et abonnement. Hvis last_event_id er oppgitt, fylles køen med
+        hendelsene etter denne fra ringen.
+        Returnerer (subscription, resumed) – resumed er False hvis historikken ikke
+        strekker seg langt nok tilbake, eller hvis flere hendelser mangler enn køen rommer
+        (klienten bør da hente et fullt øyeblikksbilde).
+        """
+        subscription = Subscription(self, self.queue_size)
+        resumed = False
+        with self._lock:
+            newest_id = self._ring[-1]["id"] if self._ring else 0
+            subscription.start_id = newest_id
+            if last_event_id is not None:
+                oldest_id = self._ring[0]["id"] if self._ring else 1
+                # ID høyere enn siste publiserte betyr at klienten kommer fra en tidligere prosess
+                if oldest_id - 1 <= last_event_id <= newest_id:
+                    missed = [event for event in self._ring if event["id"] > last_event_id]
+                    # Får ikke alt plass i køen, ville de eldste blitt kastet uten at klienten merket det
+                    resumed = len(missed) <= self.queue_size
+                    if resumed:
+                        for event in missed:
+                            subscription._offer(event)
+            self._subscribers.add(subscription)
+        logger.debug(f"Ny abonnent på '{self.name}' (totalt {len(self._subscribers)})")
+        return subscription, resumed
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "ring_size": len(self._ring),
+                "dropped": sum(s.dropped for s in self._subscribers),
+            }
+
+
+# --- Delte busser (én per navn) ---
+_buses = {}
+_buses_lock = threading.Lock()
+
+
+def get_event_bus(name):
+    """
+    Returnerer delt EventBus for gitt navn. Oppretter den hvis den ikke finnes.
+    """
+    with _buses_lock:
+        if name not in _buses:
+            _buses[name] = EventBus(name)
+        return _buses[name]
@@ -1,7 +1,7 @@
 from utils.logging.unified_logger import get_logger
 # utils/file_utils.py
 
-import json, os
+import json, os, tempfile
 
 def load_json(path):
     try:
@@ -16,4 +16,23 @@ def save_json(path, data):
 
 def ensure_directory_exists(path):
     if not os.path.exists(path):
-        os.makedirs(path)
\ No newline at end of file
+        os.makedirs(path)
+
+def atomic_write_json(path, data, indent=None):
+    """
+    Skriver JSON til en midlertidig fil i samme mappe og bytter den inn med os.replace,
+    slik at lesere aldri ser en halvskrevet fil (heller ikke ved strømbrudd midt i skrivingen).
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        os.fchmod(fd, 0o644)  # mkstemp gir 0600 – behold vanlige filrettigheter
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,121 @@
+# utils/file_watcher.py
+
+"""
+Venter på endringer i én fil.
+
+Bruker inotify (Linux, via ctypes) på katalogen, slik at også rotasjon
+(rename/opprettelse av ny fil) fanges opp. Faller tilbake til periodisk
+stat()-sjekk hvis inotify ikke er tilgjengelig.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+# inotify-konstanter fra <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        name = ctypes.util.find_library("c")
+        _libc = ctypes.CDLL(name, use_errno=True) if name else False
+    return _libc
+
+
+class FileWatcher:
+    def __init__(self, path, poll_interval=1.0):
+        self.path = os.path.abspath(path)
+        self.name = os.path.basename(self.path).encode()
+        self.poll_interval = poll_interval
+        self._fd = None
+        self._last_stat = self._stat()
+
+        libc = _get_libc()
+        if libc and hasattr(libc, "inotify_init1"):
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                wd = libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), _WATCH_MASK)
+                if wd >= 0:
+                    self._fd = fd
+                else:
+                    os.close(fd)
+
+    @property
+    def mode(self):
+        return "inotify" if self._fd is not None else "poll"
+
+    def wait(self, timeout):
+        """
+        Blokkerer til filen endres eller timeout (sekunder) går ut.
+        Returnerer True ved endring, False ved timeout.
+        """
+        if self._fd is not None:
+            return self._wait_inotify(timeout)
+        return self._wait_poll(timeout)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _wait_inotify(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if not readable:
+                return False
+            try:
+                buf = os.read(self._fd, 4096)
+            except BlockingIOError:
+                continue
+            if self._matches(buf):
+                return True
+
+    def _matches(self, buf):
+        # Går gjennom inotify_event-strukturene og ser etter hendelser for vår fil
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            _, _, _, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            name = buf[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+            if name == self.name:
+                return True
+        return False
+
+    def _wait_poll(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(min(self.poll_interval, max(deadline - time.monotonic(), 0)))
+            current = self._stat()
+            if current != self._last_stat:
+                self._last_stat = current
+                return True
+        return False
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_ino, st.st_size, st.st_mtime_ns)
+        except OSError:
+            return None
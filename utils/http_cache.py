@@ -0,0 +1,108 @@
+# utils/http_cache.py
+
+"""
+Felles ETag-/304-lag for skrivebeskyttede JSON-endepunkter.
+
+Hver ressurs har en billig versjon fra kilden sin (controllerens snapshot-versjon,
+monitor-registeret, stat av en statusfil ...). json_response():
+- svarer 304 Not Modified uten å bygge eller serialisere svaret når If-None-Match matcher
+- gjenbruker ferdig serialiserte bytes så lenge versjonen er uendret
+- bygger og serialiserer (kompakt JSON) bare når versjonen er ny
+"""
+
+import os
+import threading
+import time
+
+from flask import Response, current_app, request
+
+from utils.metrics import get_registry
+
+# Versjoner starter på nytt ved omstart, så ETag inkluderer en prosess-ID
+_ETAG_PREFIX = f"{os.getpid():x}{int(time.time()):x}"
+
+MAX_CACHED_RESOURCES = 256
+
+_cache = {}             # ressurs -> (versjon, bytes, statuskode)
+_cache_lock = threading.Lock()
+_stats = {"not_modified": 0, "cache_hits": 0, "rendered": 0}
+
+
+def file_version(path):
+    """
+    Versjon for en fil basert på stat (mtime, størrelse, inode). None hvis filen mangler.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns:x}.{st.st_size:x}.{st.st_ino:x}"
+
+
+def make_etag(resource, version):
+    return f"{_ETAG_PREFIX}-{resource}-{version}"
+
+
+def json_response(resource, version, build):
+    """
+    Returnerer JSON-svar for ressursen med ETag avledet av version.
+
+    resource: navn som skiller representasjoner (f.eks. "timing:port1")
+    version: billig versjonsverdi fra kilden; None slår av caching for kallet
+    build: funksjon uten argumenter som returnerer body eller (body, statuskode).
+           Bare 200-svar caches og får ETag.
+    """
+    if version is None:
+        return _render(build)[0]
+
+    etag = make_etag(resource, version)
+    if etag in request.if_none_match:
+        _stats["not_modified"] += 1
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    cached = _cache.get(resource)
+    if cached is not None and cached[0] == version:
+        _stats["cache_hits"] += 1
+        response = Response(cached[1], status=cached[2], mimetype="application/json")
+    else:
+        response, payload = _render(build)
+        if response.status_code != 200:
+            return response
+        with _cache_lock:
+            if resource not in _cache and len(_cache) >= MAX_CACHED_RESOURCES:
+                _cache.pop(next(iter(_cache)))
+            _cache[resource] = (version, payload, 200)
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"     # Alltid revalider, men 304 er billig
+    return response
+
+
+def _render(build):
+    result = build()
+    body, status = result if isinstance(result, tuple) else (result, 200)
+    # Samme provider som jsonify (datoer, sortering), men alltid kompakt
+    payload = current_app.json.dumps(body, separators=(",", ":")).encode("utf-8") + b"\n"
+    _stats["rendered"] += 1
+    return Response(payload, status=status, mimetype="application/json"), payload
+
+
+def get_cache_stats():
+    return {**_stats, "resources": len(_cache)}
+
+
+def _collect_metrics():
+    stats = get_cache_stats()
+    return [
+        ("garage_http_cache_responses_total", "counter", "Svar fra ETag-laget etter resultat", [
+            ({"result": "not_modified"}, stats["not_modified"]),
+            ({"result": "cache_hit"}, stats["cache_hits"]),
+            ({"result": "rendered"}, stats["rendered"]),
+        ]),
+    ]
+
+
+get_registry().register_collector(_collect_metrics)
@@ -0,0 +1,264 @@
+# utils/log_tail.py
+
+"""
+Effektiv lesing av slutten av loggfiler.
+
+- tail_lines(): leser baklengs i faste blokker fra slutten av filen, og fortsetter i
+  roterte backups (.1, .2, ...) dersom det bes om flere linjer enn filen inneholder.
+- count_lines(): antall linjer i filen, cachet per fil og oppdatert inkrementelt fra
+  forrige filposisjon (full telling bare når filen er rotert/avkortet).
+- read_time_range(): records i et tidsintervall fra jsonl-logger, via minuttindeksen (.idx).
+"""
+
+import bisect
+import json
+import os
+import threading
+
+BLOCK_SIZE = 8192
+INDEX_SUFFIX = ".idx"       # Sidecar-indeks for jsonl-logger: "<minutt-epoch> <byte-offset>" per linje
+
+_count_cache = {}       # sti -> (inode, offset, antall linjeskift, slutter_med_linjeskift)
+_count_lock = threading.Lock()
+
+
+def _tail_file(path, n, block_size=BLOCK_SIZE):
+    """
+    Returnerer de siste n linjene (bytes, med linjeskift) fra én fil.
+    """
+    if n <= 0:
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        buf = b""
+        newlines = 0
+        # Trenger n+1 linjeskift for å vite at første linje i bufferet er komplett
+        while pos > 0 and newlines <= n:
+            read_size = min(block_size, pos)
+            pos -= read_size
+            f.seek(pos)
+            block = f.read(read_size)
+            newlines += block.count(b"\n")
+            buf = block + buf
+
+    lines = buf.splitlines(keepends=True)
+    if pos > 0 and lines:
+        lines = lines[1:]   # Første linje kan være avkuttet
+    return lines[-n:]
+
+
+def tail_lines(path, n, include_rotated=True, block_size=BLOCK_SIZE):
+    """
+    Returnerer de siste n linjene (str) fra loggfilen.
+    Med include_rotated hentes manglende linjer fra path.1, path.2, ... (eldst først i resultatet).
+    Kaster FileNotFoundError hvis hovedfilen ikke finnes.
+    """
+    lines = _tail_file(path, n, block_size)
+    index = 1
+    while include_rotated and len(lines) < n:
+        rotated_path = f"{path}.{index}"
+        if not os.path.exists(rotated_path):
+            break
+        lines = _tail_file(rotated_path, n - len(lines), block_size) + lines
+        index += 1
+    return [line.decode("utf-8", errors="replace") for line in lines]
+
+
+def count_lines(path, block_size=BLOCK_SIZE * 8):
+    """
+    Returnerer antall linjer i filen (samme tolkning som readlines()).
+    Bare bytes lagt til siden forrige kall leses, så lenge inode er lik og filen ikke er avkortet.
+    """
+    st = os.stat(path)
+    with _count_lock:
+        cached = _count_cache.get(path)
+        if cached and cached[0] == st.st_ino and cached[1] <= st.st_size:
+            _, offset, newlines, ends_with_newline = cached
+        else:
+            offset, newlines, ends_with_newline = 0, 0, True
+
+        if offset < st.st_size:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while True:
+                    block = f.read(block_size)
+                    if not block:
+                        break
+                    newlines += block.count(b"\n")
+                    ends_with_newline = block.endswith(b"\n")
+                    offset += len(block)
+
+        _count_cache[path] = (st.st_ino, offset, newlines, ends_with_newline)
+
+    # En siste linje uten linjeskift teller også
+    return newlines + (0 if ends_with_newline or offset == 0 else 1)
+
+
+# Maks antall bytes som returneres per follow-kall
+MAX_FOLLOW_BYTES = 256 * 1024
+
+
+def _read_range(path, offset, max_bytes):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(max_bytes)
+
+
+def read_since(path, cursor=None, inode=None, max_bytes=MAX_FOLLOW_BYTES):
+    """
+    Returnerer bytes lagt til i loggfilen etter cursor (byte-offset).
+
+    - Uten cursor starter man ved slutten av filen (ingen data, bare ny cursor).
+    - Endret inode eller cursor forbi filslutt betyr at RotatingFileHandler har rotert:
+      resten av forrige fil hentes fra path.1 (hvis inode stemmer), deretter leses ny fil fra start.
+    - Bare hele linjer returneres, slik at en linje aldri deles mellom to kall.
+
+    Returnerer dict med data, cursor, inode, rotated og more (mer data venter).
+    """
+    st = os.stat(path)
+    if cursor is None:
+        return {"data": "", "cursor": st.st_size, "inode": st.st_ino, "rotated": False, "more": False}
+
+    chunks = []
+    budget = max_bytes
+    rotated = (inode is not None and inode != st.st_ino) or cursor > st.st_size
+    if rotated:
+        previous = f"{path}.1"
+        if inode is not None and os.path.exists(previous) and os.stat(previous).st_ino == inode:
+            rest = _read_range(previous, cursor, budget)
+            if len(rest) == budget:
+                # Mer igjen i forrige fil – fortsett der (med gammel inode) ved neste kall
+                rest = rest[:rest.rfind(b"\n") + 1] or rest
+                return {
+                    "data": rest.decode("utf-8", errors="replace"),
+                    "cursor": cursor + len(rest),
+                    "inode": inode,
+                    "rotated": True,
+                    "more": True,
+                }
+            chunks.append(rest)
+            budget -= len(rest)
+        cursor = 0
+
+    data = _read_range(path, cursor, budget) if budget > 0 else b""
+    more = len(data) == budget and cursor + len(data) < st.st_size
+
+    # Kutt ved siste linjeskift (ufullstendig linje hentes ved neste kall)
+    if data and not data.endswith(b"\n"):
+        cut = data.rfind(b"\n")
+        if cut >= 0:
+            data = data[:cut + 1]
+        elif not more:
+            data = b""
+    chunks.append(data)
+
+    return {
+        "data": b"".join(chunks).decode("utf-8", errors="replace"),
+        "cursor": cursor + len(data),
+        "inode": st.st_ino,
+        "rotated": rotated,
+        "more": more,
+    }
+
+
+def _load_index(path):
+    """
+    Leser minuttindeksen for en loggfil. Returnerer (minutter, offsets) eller None uten indeks.
+    """
+    try:
+        with open(path + INDEX_SUFFIX, "r", encoding="utf-8") as f:
+            minutes, offsets = [], []
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    minutes.append(int(parts[0]))
+                    offsets.append(int(parts[1]))
+            return minutes, offsets
+    except (OSError, ValueError):
+        return None
+
+
+def _read_records(path, index, start_ts, end_ts, limit):
+    """
+    Leser jsonl-records med start_ts <= ts <= end_ts fra én fil.
+    Med indeks sekes det rett til minuttet som inneholder start_ts, og lesingen stopper
+    ved første minutt etter end_ts. Uten indeks leses filen fra start.
+    """
+    start_offset, end_offset = 0, None
+    if index and index[0]:
+        minutes, offsets = index
+        if start_ts is not None:
+            pos = bisect.bisect_right(minutes, start_ts) - 1
+            start_offset = offsets[pos] if pos >= 0 else 0
+        if end_ts is not None:
+            pos = bisect.bisect_right(minutes, end_ts)
+            end_offset = offsets[pos] if pos < len(offsets) else None
+
+    records = []
+    with open(path, "rb") as f:
+        f.seek(start_offset)
+        offset = start_offset
+        for raw in f:
+            if end_offset is not None and offset >= end_offset:
+                break
+            offset += len(raw)
+            try:
+                record = json.loads(raw)
+                ts = float(record["ts"])
+            except (ValueError, KeyError, TypeError):
+                continue        # Ikke-JSON linje (f.eks. fra før formatbytte)
+            if start_ts is not None and ts < start_ts:
+                continue
+            if end_ts is not None and ts > end_ts:
+                if index:
+                    break
+                continue
+            records.append(record)
+            if len(records) >= limit:
+                break
+    return records
+
+
+def _index_covers(index, start_ts, end_ts):
+    """
+    False hvis indeksen viser at filen ligger helt utenfor intervallet.
+    """
+    if not index or not index[0]:
+        return True
+    minutes = index[0]
+    if end_ts is not None and minutes[0] > end_ts:
+        return False
+    if start_ts is not None and minutes[-1] + 60 <= start_ts:
+        return False
+    return True
+
+
+def read_time_range(path, start_ts=None, end_ts=None, limit=500, include_rotated=True):
+    """
+    Returnerer opptil limit records (dict, eldst først) med tidsstempel i [start_ts, end_ts]
+    fra en jsonl-logg. Roterte filer (path.N ... path.1) leses før aktiv fil, og filer som
+    ifølge indeksen ligger utenfor intervallet hoppes over.
+    Kaster FileNotFoundError hvis hovedfilen ikke finnes.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    paths = [path]
+    number = 1
+    while include_rotated and os.path.exists(f"{path}.{number}"):
+        paths.insert(0, f"{path}.{number}")
+        number += 1
+
+    records = []
+    for file_path in paths:
+        index = _load_index(file_path)
+        if not _index_covers(index, start_ts, end_ts):
+            continue
+        try:
+            records += _read_records(file_path, index, start_ts, end_ts, limit - len(records))
+        except FileNotFoundError:
+            continue        # Rotert bort mens vi leste
+        if len(records) >= limit:
+            break
+    return records
@@ -1,64 +1,655 @@
 # Filnavn: utils/logging/unified_logger.py
 
+import atexit
+import copy
 import logging
 import logging.handlers
+import queue
+import random
 import threading
+import time
 import os
 import json
 
 from config import config_paths
 from config import log_levels
 from config import log_categories
+from utils.metrics import get_registry
+from utils.log_tail import INDEX_SUFFIX, tail_lines
+
+LOG_RECORDS = get_registry().counter(
+    "garage_log_records_total", "Antall loggmeldinger per kategori og nivå", ("category", "level")
+)
 
 # --- Colorama for console farger ---
+# Fargekodene er vanlige ANSI-sekvenser (samme verdier som colorama.Fore/Style).
+# colorama trengs bare for å oversette dem på Windows-konsoll; uten autoreset
+# pakkes ikke sys.stdout/stderr inn på Linux, så hver skriving slipper ekstra arbeid.
 try:
-    from colorama import init as colorama_init, Fore, Style
-    colorama_init(autoreset=True)
+    from colorama import init as colorama_init
+    colorama_init()
     COLORAMA_ENABLED = True
 except ImportError:
     COLORAMA_ENABLED = False
 
+CONSOLE_FORMAT = "%(asctime)s [%(levelname)s] [%(category)s] [%(name)s] %(message)s"
+
 # --- Farget formatter for console ---
 class ColorFormatter(logging.Formatter):
+    """
+    Konsollformatter som bygger linjen direkte fra record-feltene.
+    Ferdig fargelagt prefiks ("[LEVEL] [kategori] ") lages én gang per (nivå, kategori)
+    og gjenbrukes, og tidsstempelet gjenbrukes innenfor samme sekund.
+    Med use_color=False blir utdata identisk med filformatet.
+    """
     LEVEL_COLORS = {
-        "ERROR": Fore.RED,
-        "WARNING": Fore.YELLOW,
-        "CRITICAL": Fore.RED + Style.BRIGHT,
-        "INFO": Fore.GREEN,
-        "DEBUG": Fore.CYAN,
+        "ERROR": "\x1b[31m",                # Fore.RED
+        "WARNING": "\x1b[33m",              # Fore.YELLOW
+        "CRITICAL": "\x1b[31m\x1b[1m",       # Fore.RED + Style.BRIGHT
+        "INFO": "\x1b[32m",                 # Fore.GREEN
+        "DEBUG": "\x1b[36m",                # Fore.CYAN
     }
-    CAT_COLOR = Fore.MAGENTA
-    RESET = Style.RESET_ALL
+    CAT_COLOR = "\x1b[35m"                  # Fore.MAGENTA
+    RESET = "\x1b[0m"                       # Style.RESET_ALL
+
+    def __init__(self, fmt=CONSOLE_FORMAT, datefmt=None, use_color=True):
+        super().__init__(fmt, datefmt=datefmt)
+        self.use_color = use_color
+        # Hurtigveien forutsetter standardformatet; annet format går via logging.Formatter
+        self._direct = fmt == CONSOLE_FORMAT
+        self._prefixes = {}
+        self._time_cache = (None, "")   # (sekund, ferdig tidsstempel)
+
+    def _prefix(self, levelname, category):
+        key = (levelname, category)
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            level_tag = f"[{levelname}]"
+            cat_tag = f"[{category}]"
+            if self.use_color:
+                color = self.LEVEL_COLORS.get(levelname)
+                if color:
+                    level_tag = f"{color}{level_tag}{self.RESET}"
+                cat_tag = f"{self.CAT_COLOR}{cat_tag}{self.RESET}"
+            prefix = f" {level_tag} {cat_tag} "
+            self._prefixes[key] = prefix
+        return prefix
+
+    def formatTime(self, record, datefmt=None):
+        if not datefmt:
+            return super().formatTime(record, datefmt)   # Standardformatet har millisekunder
+        second = int(record.created)
+        cached_second, cached = self._time_cache
+        if second != cached_second:
+            cached = super().formatTime(record, datefmt)
+            self._time_cache = (second, cached)
+        return cached
 
     def format(self, record):
-        msg = super().format(record)
-        # Fargelegg [LEVEL] uansett hvor i linjen den er
-        for level, color in self.LEVEL_COLORS.items():
-            tag = f"[{level}]"
-            msg = msg.replace(tag, f"{color}{tag}{self.RESET}")
-        # Fargelegg første kategori-tag (f.eks. [system]), men IKKE [BOOTSTRAP]
-        # Bruk regex for å finne første [noe] etter [LEVEL]
-        import re
-        # Finn alle tags av formen [ord]
-        tags = list(re.finditer(r"\[[a-zA-Z0-9_]+\]", msg))
-        # Vi vil farge NESTE tag etter [LEVEL]
-        for i, match in enumerate(tags):
-            if any(match.group(0) == f"[{lvl}]" for lvl in self.LEVEL_COLORS):
-                if i+1 < len(tags):
-                    cat_tag = tags[i+1].group(0)
-                    if cat_tag != "[BOOTSTRAP]":
-                        msg = msg.replace(cat_tag, f"{self.CAT_COLOR}{cat_tag}{self.RESET}", 1)
-                break
-        return msg
+        if not self._direct:
+            msg = super().format(record)
+            color = self.LEVEL_COLORS.get(record.levelname) if self.use_color else None
+            if color:
+                tag = f"[{record.levelname}]"
+                msg = msg.replace(tag, f"{color}{tag}{self.RESET}", 1)
+            return msg
+
+        record.message = record.getMessage()
+        line = (
+            self.formatTime(record, self.datefmt)
+            + self._prefix(record.levelname, getattr(record, "category", "unknown_category"))
+            + f"[{record.name}] {record.message}"
+        )
+        # Samme håndtering av exceptions/stack som logging.Formatter.format
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line = f"{line}\n{record.exc_text}"
+        if record.stack_info:
+            line = f"{line}\n{self.formatStack(record.stack_info)}"
+        return line
+
+
+def _stream_supports_color(stream):
+    """
+    Farger kun når strømmen er en terminal (ikke ved omdirigering til fil/journald).
+    NO_COLOR-miljøvariabelen slår farger av uansett.
+    """
+    if os.environ.get("NO_COLOR"):
+        return False
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+# --- JSON-linjer for fil ("format": "jsonl") ---
+# Felter som alltid finnes på en LogRecord; alt annet regnes som strukturerte extra-felt
+_RECORD_ATTRS = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {
+    "message", "asctime", "taskName", "category", "source", "log_route",
+}
+
+
+class JsonLineFormatter(logging.Formatter):
+    """
+    Ett kompakt JSON-objekt per linje:
+        {"ts": 1748436312.123, "time": "...", "level": "INFO", "category": "system",
+         "name": "...", "source": null, "msg": "...", <extra-felt>, "exc": "..."}
+    Extra-felt er det som sendes med logger.info(..., extra={...}).
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "category": getattr(record, "category", "unknown_category"),
+            "name": record.name,
+            "source": getattr(record, "source", None),
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str)
+
 
 # --- LoggerAdapter for kategori ---
 class CategoryAdapter(logging.LoggerAdapter):
     def process(self, msg, kwargs):
         kwargs["extra"] = kwargs.get("extra", {})
         kwargs["extra"]["category"] = self.extra.get("category", "unknown_category")
+        kwargs["extra"].setdefault("source", self.extra.get("source"))
         # NB: IKKE sett "name" i extra! Det gir KeyError.
         return msg, kwargs
 
+    def change(self, msg, *args, **kwargs):
+        """Statusendring (egendefinert nivå CHANGE)."""
+        self.log(log_levels.LOG_LEVELS["CHANGE"], msg, *args, **kwargs)
+
+    def timing(self, port, *details, **kwargs):
+        """
+        Timingmåling (nivå TIMING). Brukes som timing(port, retning, sekunder)
+        eller timing(port, {"direction": ..., "t2": ...}); dict-felter legges også i extra.
+        """
+        if len(details) == 1 and isinstance(details[0], dict):
+            fields = details[0]
+            kwargs["extra"] = {**fields, **kwargs.get("extra", {})}
+            text = ", ".join(f"{key}={value}" for key, value in fields.items())
+        else:
+            text = " ".join(str(detail) for detail in details)
+        self.log(log_levels.LOG_LEVELS["TIMING"], "%s: %s", port, text, **kwargs)
+
+# --- Teller loggmeldinger for /metrics ---
+class MetricsFilter(logging.Filter):
+    def __init__(self, category):
+        super().__init__()
+        self.category = category
+
+    def filter(self, record):
+        LOG_RECORDS.labels(category=self.category, level=record.levelname).inc()
+        return True
+
+# --- Rate-begrensning og sampling per kategori/logger ---
+# Konfigureres med "rate_limit" under log_settings.<kategori> i config_logging.json.
+# Uten rate_limit legges det ikke på noe filter i det hele tatt.
+
+DEFAULT_RATE_LIMIT = {
+    "rate": None,                   # Records per sekund (token bucket); None = ingen grense
+    "burst": 20,                    # Maks antall records i en burst
+    "sample": 1.0,                  # Andel records som beholdes (før token bucket)
+    "max_level": "INFO",            # Nivåer over dette begrenses aldri
+    "summary_interval_sec": 10,     # Minste tid mellom "N meldinger undertrykt"-linjer
+}
+
+
+class RateLimiter:
+    """
+    Token bucket + sampling for én logger (kategori, navn). allow() kalles i loggerens tråd;
+    undertrykte records telles og oppsummeres av lyttertråden via take_summary().
+    """
+
+    def __init__(self, category, name, config):
+        self.category = category
+        self.name = name
+        self.rate = float(config["rate"]) if config.get("rate") is not None else None
+        self.burst = max(1.0, float(config["burst"]))
+        self.sample = float(config["sample"])
+        self.max_level = _get_valid_level(str(config["max_level"]))
+        self.summary_interval = float(config["summary_interval_sec"])
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.last_summary = self.updated
+        self.suppressed = 0             # Siden forrige oppsummering
+        self.suppressed_total = 0
+        self.suppressed_level = logging.NOTSET
+        self.last_record = None         # Formateres først i take_summary, ikke per undertrykt melding
+        self._lock = threading.Lock()
+
+    def allow(self, record):
+        if record.levelno > self.max_level:
+            return True
+        if self.sample < 1.0 and random.random() >= self.sample:
+            with self._lock:
+                self._suppress(record)
+            return False
+        if self.rate is None:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if tokens >= 1.0:
+                self.tokens = tokens - 1.0
+                return True
+            self.tokens = tokens
+            self._suppress(record)
+            return False
+
+    def _suppress(self, record):
+        self.suppressed += 1
+        self.suppressed_total += 1
+        if record.levelno > self.suppressed_level:
+            self.suppressed_level = record.levelno
+        self.last_record = record
+
+    def take_summary(self, now, force=False):
+        """
+        Returnerer en oppsummerings-record hvis noe er undertrykt og intervallet er gått.
+        """
+        with self._lock:
+            if not self.suppressed or (not force and now - self.last_summary < self.summary_interval):
+                return None
+            count, level, last_record = self.suppressed, self.suppressed_level, self.last_record
+            elapsed = now - self.last_summary
+            self.suppressed = 0
+            self.suppressed_level = logging.NOTSET
+            self.last_summary = now
+            self.last_record = None
+
+        try:
+            example = last_record.getMessage()
+        except Exception:
+            example = str(last_record.msg)
+        if len(example) > 120:
+            example = example[:117] + "..."
+        record = logging.LogRecord(
+            self.name, level, __file__, 0,
+            "%d lignende meldinger undertrykt siste %.0f s (siste: %s)", (count, elapsed, example), None,
+        )
+        record.category = self.category
+        record.source = "rate_limit"
+        record.log_route = self.category
+        record.suppressed = count
+        return record
+
+    def get_stats(self):
+        return {"suppressed": self.suppressed_total, "pending": self.suppressed}
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, limiter):
+        super().__init__()
+        self.limiter = limiter
+
+    def filter(self, record):
+        return self.limiter.allow(record)
+
+
+# --- Asynkron loggpipeline ---
+# Alle loggere legger records i én felles, begrenset kø (QueueHandler). Én bakgrunnstråd
+# (QueueListener) skriver til fil/konsoll, slik at SD-kortets fsync-pauser aldri treffer
+# pigpio-callbacks, forespørsler eller sensorløkker.
+
+DEFAULT_ASYNC_CONFIG = {
+    "queue_size": 10000,
+    "debug_drop_threshold": 0.8,    # Andel full kø der DEBUG-meldinger begynner å kastes
+    "batch_size": 200,              # Maks antall records mellom hver flush til fil
+}
+
+
+class BatchedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler som ikke flusher per record. Lytteren kaller flush_batch()
+    når køen er tom eller batch_size er nådd; close() flusher alltid.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dirty = False
+
+    def flush(self):
+        self.dirty = True
+
+    def flush_batch(self):
+        self.acquire()
+        try:
+            if self.stream and self.dirty:
+                self.stream.flush()
+            self.dirty = False
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+
+class IndexedRotatingFileHandler(BatchedRotatingFileHandler):
+    """
+    Filhandler for jsonl-kategorier. Skriver i tillegg en sidecar-indeks (<fil>.idx) med
+    én linje "<minutt-epoch> <byte-offset>" for første record i hvert minutt, slik at
+    tidsintervall-spørringer kan seke direkte (se log_tail.read_time_range).
+    Indeksen roteres sammen med loggfilen (<fil>.1.idx, <fil>.2.idx, ...).
+    """
+
+    def __init__(self, filename, *args, **kwargs):
+        super().__init__(filename, *args, **kwargs)
+        self.index_path = self.baseFilename + INDEX_SUFFIX
+        self._index = None
+        self._last_minute = self._read_last_minute()
+
+    def _read_last_minute(self):
+        try:
+            last = tail_lines(self.index_path, 1, include_rotated=False)
+            return int(last[0].split()[0]) if last else None
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def emit(self, record):
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            minute = int(record.created // 60) * 60
+            if self._last_minute is None or minute > self._last_minute:
+                if self.stream is None:
+                    self.stream = self._open()
+                if self._index is None:
+                    self._index = open(self.index_path, "a", encoding="utf-8")
+                self._index.write(f"{minute} {self.stream.tell()}\n")
+                self._last_minute = minute
+            logging.FileHandler.emit(self, record)
+        except Exception:
+            self.handleError(record)
+
+    def flush_batch(self):
+        self.acquire()
+        try:
+            if self._index and self.dirty:
+                self._index.flush()
+        finally:
+            self.release()
+        super().flush_batch()
+
+    def _close_index(self):
+        if self._index:
+            self._index.close()
+            self._index = None
+
+    def doRollover(self):
+        self._close_index()
+        # Samme navneskjema som RotatingFileHandler: fil.N -> fil.N+1, fil -> fil.1
+        for i in range(self.backupCount - 1, 0, -1):
+            src = f"{self.baseFilename}.{i}{INDEX_SUFFIX}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.baseFilename}.{i + 1}{INDEX_SUFFIX}")
+        if os.path.exists(self.index_path):
+            if self.backupCount > 0:
+                os.replace(self.index_path, f"{self.baseFilename}.1{INDEX_SUFFIX}")
+            else:
+                os.remove(self.index_path)
+        super().doRollover()
+        self._last_minute = None
+
+    def close(self):
+        self.acquire()
+        try:
+            self._close_index()
+        finally:
+            self.release()
+        super().close()
+
+
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+
+class _CategoryQueueHandler(logging.handlers.QueueHandler):
+    """
+    Felles inngang til køen for alle loggere i en kategori.
+    Ved nesten full kø kastes DEBUG først; ved full kø kastes alt (telles per nivå).
+    """
+
+    def __init__(self, pipeline, category):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+        self.category = category
+
+    def prepare(self, record):
+        """
+        Som QueueHandler.prepare, men traceback og stack holdes utenfor msg:
+        meldingen flettes og tracebacken formateres én gang i kallerens tråd (exc_info kan
+        ikke trygt leses senere), og JSON-linjene får dem i egne felt (exc/stack).
+        """
+        message = record.getMessage()
+        record = copy.copy(record)      # Andre handlere i kjeden skal se originalen
+        record.message = message
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        record.log_route = self.category
+        return record
+
+    def enqueue(self, record):
+        self.queue.put_nowait(record)
+
+    def emit(self, record):
+        pipeline = self.pipeline
+        if not pipeline.running:
+            # Før oppstart / etter nedstenging: skriv synkront
+            record.log_route = self.category
+            pipeline.dispatch(record)
+            pipeline.flush_all()
+            return
+        if record.levelno <= logging.DEBUG and self.queue.qsize() >= pipeline.debug_drop_limit:
+            pipeline.count_drop(record)
+            return
+        try:
+            self.enqueue(self.prepare(record))
+        except queue.Full:
+            pipeline.count_drop(record)
+        except Exception:
+            self.handleError(record)
+
+
+class _BatchingQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener som håndterer records i batcher og flusher filhandlere
+    når køen er tom eller batch_size records er skrevet.
+    """
+
+    def __init__(self, pipeline):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+
+    def handle(self, record):
+        self.pipeline.dispatch(record)
+
+    def enqueue_sentinel(self):
+        # Blokkerende put: sentinel skal frem selv om køen er full
+        self.queue.put(self._sentinel)
+
+    def _monitor(self):
+        q = self.queue
+        pipeline = self.pipeline
+        pending = 0
+        while True:
+            try:
+                # Med rate-begrensning våkner tråden jevnlig for å skrive oppsummeringer
+                record = q.get(timeout=pipeline.summary_poll_sec)
+            except queue.Empty:
+                if pipeline.flush_suppressed():
+                    pipeline.flush_all()
+                continue
+            if record is self._sentinel:
+                pipeline.flush_suppressed(force=True)
+                pipeline.flush_all()
+                break
+            self.handle(record)
+            pending += 1
+            if pending >= pipeline.batch_size or q.empty():
+                pipeline.flush_suppressed()
+                pipeline.flush_all()
+                pipeline.stats["batches"] += 1
+                pipeline.stats["max_batch"] = max(pipeline.stats["max_batch"], pending)
+                pending = 0
+
+
+class LoggingPipeline:
+    def __init__(self, config=None):
+        config = {**DEFAULT_ASYNC_CONFIG, **(config or {})}
+        self.queue = queue.Queue(maxsize=int(config["queue_size"]))
+        self.debug_drop_limit = int(config["queue_size"] * float(config["debug_drop_threshold"]))
+        self.batch_size = int(config["batch_size"])
+        self.handlers = {}              # kategori -> [handlere]
+        self.queue_handlers = {}        # kategori -> _CategoryQueueHandler
+        self.limiters = {}              # (kategori, loggernavn) -> RateLimiter
+        self.summary_poll_sec = None    # Settes når første RateLimiter opprettes
+        self.stats = {"handled": 0, "batches": 0, "max_batch": 0, "dropped": {}}
+        self.running = False
+        self._listener = None
+
+    def start(self):
+        if self.running:
+            return
+        self._listener = _BatchingQueueListener(self)
+        self._listener.start()
+        self._listener._thread.name = "log_listener"
+        self.running = True
+
+    def stop(self):
+        """
+        Tømmer køen, flusher og lukker alle filhandlere. Senere logging skrives synkront.
+        """
+        if self.running:
+            self.running = False
+            self._listener.stop()
+        else:
+            self.flush_suppressed(force=True)
+        for handlers in self.handlers.values():
+            for handler in handlers:
+                handler.flush()
+                if isinstance(handler, BatchedRotatingFileHandler):
+                    handler.flush_batch()
+
+    def dispatch(self, record):
+        for handler in self.handlers.get(getattr(record, "log_route", None), ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        self.stats["handled"] += 1
+
+    def flush_all(self):
+        for handlers in self.handlers.values():
+            for handler in handlers:
+                if isinstance(handler, BatchedRotatingFileHandler):
+                    handler.flush_batch()
+
+    def flush_suppressed(self, force=False):
+        """
+        Skriver "N lignende meldinger undertrykt"-linjer for loggere som har undertrykt noe.
+        Returnerer True hvis noe ble skrevet.
+        """
+        if not self.limiters:
+            return False
+        now = time.monotonic()
+        written = False
+        for limiter in list(self.limiters.values()):
+            record = limiter.take_summary(now, force)
+            if record is not None:
+                self.dispatch(record)
+                written = True
+        return written
+
+    def rate_limiter(self, category, name, config):
+        key = (category, name)
+        limiter = self.limiters.get(key)
+        if limiter is None:
+            limiter = self.limiters[key] = RateLimiter(category, name, config)
+            self.summary_poll_sec = 1.0
+        return limiter
+
+    def count_drop(self, record):
+        dropped = self.stats["dropped"]
+        dropped[record.levelname] = dropped.get(record.levelname, 0) + 1
+
+    def queue_handler(self, category):
+        handler = self.queue_handlers.get(category)
+        if handler is None:
+            handler = self.queue_handlers[category] = _CategoryQueueHandler(self, category)
+        return handler
+
+    def get_stats(self):
+        return {
+            "running": self.running,
+            "queued": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "handled": self.stats["handled"],
+            "batches": self.stats["batches"],
+            "max_batch": self.stats["max_batch"],
+            "dropped": dict(self.stats["dropped"]),
+            "suppressed": {
+                f"{category}/{name}": limiter.get_stats()["suppressed"]
+                for (category, name), limiter in self.limiters.items()
+            },
+        }
+
+
+_pipeline = None
+
+
+def _get_pipeline(config):
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = LoggingPipeline(config.get("async", {}))
+        _pipeline.start()
+        atexit.register(shutdown_logging)
+        get_registry().register_collector(_collect_metrics)
+    return _pipeline
+
+
+def shutdown_logging():
+    """
+    Skriver ut alt som ligger i køen og flusher loggfilene. Trygt å kalle flere ganger.
+    """
+    if _pipeline is not None:
+        _pipeline.stop()
+
+
+def get_logging_stats():
+    return _pipeline.get_stats() if _pipeline else {"running": False}
+
+
+def _collect_metrics():
+    stats = get_logging_stats()
+    return [
+        ("garage_log_queue_length", "gauge", "Records som venter i loggkøen", [({}, stats.get("queued", 0))]),
+        ("garage_log_dropped_total", "counter", "Loggmeldinger kastet pga. full kø", [
+            ({"level": level}, count) for level, count in stats.get("dropped", {}).items()
+        ]),
+        ("garage_log_suppressed_total", "counter", "Loggmeldinger undertrykt av rate-begrensning/sampling", [
+            ({"category": key.split("/", 1)[0], "logger": key.split("/", 1)[1]}, count)
+            for key, count in stats.get("suppressed", {}).items()
+        ]),
+    ]
+
+
 # --- Trådsikker logger-cache ---
 _loggers = {}
 _lock = threading.RLock()
@@ -104,8 +695,8 @@ def _get_valid_level(level_str):
     Støtter custom nivå via log_levels.py, ellers standard logging.
     """
     try:
-        if hasattr(log_levels, "LEVELS") and level_str.upper() in log_levels.LEVELS:
-            return log_levels.LEVELS[level_str.upper()]
+        if level_str.upper() in log_levels.LOG_LEVELS:
+            return log_levels.LOG_LEVELS[level_str.upper()]
     except Exception:
         pass
     return getattr(logging, level_str.upper(), logging.INFO)
@@ -147,9 +738,7 @@ def get_logger(name, category="system", source=None):
 
         # Formatter-streng med kategori og navn
         timestamp_fmt = config.get("timestamp_format", "%Y-%m-%d %H:%M:%S")
-        fmt_str = "%(asctime)s [%(levelname)s] [%(category)s] [%(name)s] %(message)s"
-        formatter = logging.Formatter(fmt_str, datefmt=timestamp_fmt)
-        color_formatter = ColorFormatter(fmt_str, datefmt=timestamp_fmt)
+        formatter = logging.Formatter(CONSOLE_FORMAT, datefmt=timestamp_fmt)
 
         logger = logging.getLogger(f"{name}_{valid_category}_{source or '-'}")
         logger.name = name
@@ -159,34 +748,58 @@ def get_logger(name, category="system", source=None):
         if logger.hasHandlers():
             logger.handlers.clear()
 
-        # Filhandler med rotasjon
-        if settings.get("file_enabled", True):
-            log_dir = getattr(config_paths, "LOG_DIR", ".")
-            file_path = os.path.join(log_dir, f"{valid_category}.log")
-            max_bytes = int(config.get("max_file_size_mb", 10)) * 1024 * 1024
-            backup_count = int(config.get("max_backups_files", 5))
-            try:
-                os.makedirs(log_dir, exist_ok=True)
-                fh = logging.handlers.RotatingFileHandler(
-                    file_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
-                )
-                fh.setFormatter(formatter)
-                fh.setLevel(_get_valid_level(settings.get("file_level", "INFO")))
-                logger.addHandler(fh)
-            except Exception as e:
-                print(f"[LOGGER] FEIL ved oppsett av loggfil {file_path}: {e}")
-
-        # Console handler – med farger
-        if settings.get("console_enabled", True):
-            ch = logging.StreamHandler()
-            ch.setFormatter(color_formatter)
-            ch.setLevel(_get_valid_level(settings.get("console_level", "INFO")))
-            logger.addHandler(ch)
+        # Fil- og konsollhandlere deles av alle loggere i kategorien og eies av lyttertråden
+        pipeline = _get_pipeline(config)
+        if valid_category not in pipeline.handlers:
+            handlers = []
+
+            # Filhandler med rotasjon
+            if settings.get("file_enabled", True):
+                log_dir = getattr(config_paths, "LOG_DIR", ".")
+                file_path = os.path.join(log_dir, f"{valid_category}.log")
+                max_bytes = int(config.get("max_file_size_mb", 10)) * 1024 * 1024
+                backup_count = int(config.get("max_backups_files", 5))
+                try:
+                    os.makedirs(log_dir, exist_ok=True)
+                    if settings.get("format", "plain") == "jsonl":
+                        fh = IndexedRotatingFileHandler(
+                            file_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+                        )
+                        fh.setFormatter(JsonLineFormatter(datefmt=timestamp_fmt))
+                    else:
+                        fh = BatchedRotatingFileHandler(
+                            file_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+                        )
+                        fh.setFormatter(formatter)
+                    fh.setLevel(_get_valid_level(settings.get("file_level", "INFO")))
+                    handlers.append(fh)
+                except Exception as e:
+                    print(f"[LOGGER] FEIL ved oppsett av loggfil {file_path}: {e}")
+
+            # Console handler – med farger
+            if settings.get("console_enabled", True):
+                ch = logging.StreamHandler()
+                ch.setFormatter(ColorFormatter(
+                    CONSOLE_FORMAT, datefmt=timestamp_fmt, use_color=_stream_supports_color(ch.stream)
+                ))
+                ch.setLevel(_get_valid_level(settings.get("console_level", "INFO")))
+                handlers.append(ch)
+
+            pipeline.handlers[valid_category] = handlers
+
+        logger.addHandler(pipeline.queue_handler(valid_category))
 
         logger.propagate = False
+        logger.filters = [f for f in logger.filters if not isinstance(f, (MetricsFilter, RateLimitFilter))]
+        rate_limit = settings.get("rate_limit")
+        if rate_limit:
+            # Felles innstillinger for kategorien, evt. overstyrt per logger under "loggers"
+            limit_config = {**DEFAULT_RATE_LIMIT, **rate_limit, **rate_limit.get("loggers", {}).get(name, {})}
+            logger.addFilter(RateLimitFilter(pipeline.rate_limiter(valid_category, name, limit_config)))
+        logger.addFilter(MetricsFilter(valid_category))
 
         # WRAP logger i CategoryAdapter slik at category alltid følger med til formatter!
-        logger = CategoryAdapter(logger, {"category": valid_category})
+        logger = CategoryAdapter(logger, {"category": valid_category, "source": source})
 
         _loggers[key] = logger
         return logger
@@ -0,0 +1,250 @@
+# utils/metrics.py
+
+"""
+Enkel metrikk-registry med Prometheus tekstformat (uten eksterne avhengigheter).
+
+- Counter, Gauge og Histogram oppdateres fra varme kodestier uten lås
+  (enkle tilordninger/addisjoner under GIL; et sjeldent tapt inkrement er akseptabelt).
+- Verdier som allerede finnes andre steder (portstatus, monitor-registry, psutil)
+  hentes via collect-callbacks først når /metrics leses.
+- Ferdig rendret tekst caches i RENDER_CACHE_TTL sekunder, slik at tette scrapes
+  ikke bygger teksten på nytt.
+"""
+
+import bisect
+import math
+import threading
+import time
+
+RENDER_CACHE_TTL = 1.0
+
+DEFAULT_BUCKETS = (0.5, 1, 2, 5, 10, 15, 20, 30, 45, 60, 90, 120)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if math.isnan(value):
+            return "NaN"
+        return repr(value)
+    return str(value)
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()       # Brukes bare når et nytt label-sett opprettes
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        # Metrikk uten labels brukes direkte (counter.inc())
+        return self.labels()
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            labels = list(zip(self.labelnames, key))
+            yield from child.samples(self.name, labels)
+
+
+class _ValueChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class _CounterChild(_ValueChild):
+    __slots__ = ()
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _GaugeChild(_ValueChild):
+    __slots__ = ()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # Siste bøtte er +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            cumulative += count
+            yield f"{name}_bucket", labels + [("le", _format_value(float(bound)))], cumulative
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+
+class MetricsRegistry:
+    def __init__(self, cache_ttl=RENDER_CACHE_TTL):
+        self.cache_ttl = cache_ttl
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+        self._cached = None
+        self._cached_at = 0.0
+        self.renders = 0
+
+    def _register(self, cls, name, help_text, labelnames=(), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, help_text, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metrikk '{name}' er allerede registrert som {metric.metric_type}")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def register_collector(self, func):
+        """
+        Registrerer en callback som kalles ved rendering. Den returnerer en liste med
+        (navn, type, hjelpetekst, [(labels-dict, verdi), ...]).
+        """
+        with self._lock:
+            if func not in self._collectors:
+                self._collectors.append(func)
+        return func
+
+    def render(self):
+        """
+        Returnerer hele eksposisjonen som bytes (cachet i cache_ttl sekunder).
+        """
+        now = time.monotonic()
+        cached = self._cached
+        if cached is not None and now - self._cached_at < self.cache_ttl:
+            return cached
+        with self._render_lock:
+            if self._cached is not None and time.monotonic() - self._cached_at < self.cache_ttl:
+                return self._cached
+            self._cached = self._render().encode("utf-8")
+            self._cached_at = time.monotonic()
+            self.renders += 1
+            return self._cached
+
+    def _render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for func in collectors:
+            try:
+                families = func() or []
+            except Exception as e:
+                lines.append(f"# collector {getattr(func, '__qualname__', func)} feilet: {_escape(e)}")
+                continue
+            for name, metric_type, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def get_registry():
+    return REGISTRY
@@ -0,0 +1,178 @@
+# utils/relay_scheduler.py
+
+"""
+Ikke-blokkerende pulsplanlegger for releer.
+
+API-tråden legger bare inn en pulskommando og får tilbake en kommando-ID.
+En egen timer-tråd setter og tilbakestiller relepinnene når fristene (time.monotonic)
+er nådd, slik at flere porter kan pulses samtidig uten å holde Flask-tråder.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from utils.logging.unified_logger import get_logger
+
+logger = get_logger("relay_scheduler", category="system")
+
+
+class RelayPulseScheduler:
+    def __init__(self, pi, relay_pins, relay_config, history_size=100):
+        self.pi = pi
+        self.relay_pins = relay_pins
+        self.active_state = relay_config.get("active_state", 1)
+        self.pulse_duration = relay_config.get("pulse_duration", 0.4)
+        # Minste pause mellom to pulser på samme rele (sekunder)
+        self.min_gap = relay_config.get("min_pulse_gap", 0.2)
+
+        self._events = []                   # heap: (frist, seq, handling, kommando-ID, port, pin)
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._commands = OrderedDict()      # kommando-ID -> kommando-dict (begrenset historikk)
+        self._history_size = history_size
+        self._pin_busy_until = {}           # pin -> monotonic-tid når pinnen er ledig igjen
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        self.stats = {"queued": 0, "completed": 0, "failed": 0, "max_lateness_ms": 0.0}
+        self.pulse_counts = {port: 0 for port in relay_pins}     # Fullførte pulser (telles ved "off")
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="relay_scheduler", daemon=True)
+        self._thread.start()
+        logger.info("Relé-pulsplanlegger startet")
+
+    def stop(self, timeout=2.0):
+        """
+        Stopper timer-tråden og setter alle releer til inaktiv tilstand.
+        """
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._events.clear()
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+        for port, pin in self.relay_pins.items():
+            try:
+                self.pi.write(pin, 1 - self.active_state)
+            except Exception as e:
+                logger.error(f"Kunne ikke deaktivere rele for {port} ved stopp: {e}")
+        logger.info("Relé-pulsplanlegger stoppet")
+
+    def pulse(self, port, duration=None):
+        """
+        Legger inn en puls for gitt port og returnerer kommando-ID umiddelbart.
+        Kaster ValueError hvis porten ikke finnes i relay_pins.
+        """
+        pin = self.relay_pins.get(port)
+        if pin is None:
+            raise ValueError(f"[RELAY] Ugyldig portnavn: '{port}' ikke funnet i relay_pins")
+
+        duration = self.pulse_duration if duration is None else duration
+        now = time.monotonic()
+
+        with self._cond:
+            # Køes bak en eventuell puls som allerede pågår på samme pinne
+            start_at = max(now, self._pin_busy_until.get(pin, 0.0))
+            end_at = start_at + duration
+            self._pin_busy_until[pin] = end_at + self.min_gap
+
+            command_id = next(self._ids)
+            self._commands[command_id] = {
+                "id": command_id,
+                "port": port,
+                "pin": pin,
+                "duration": duration,
+                "state": "queued",
+                "queued_at": now,
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+            }
+            while len(self._commands) > self._history_size:
+                self._commands.popitem(last=False)
+
+            heapq.heappush(self._events, (start_at, next(self._seq), "on", command_id, port, pin))
+            heapq.heappush(self._events, (end_at, next(self._seq), "off", command_id, port, pin))
+            self.stats["queued"] += 1
+            self._cond.notify()
+
+        return command_id
+
+    def get_command(self, command_id):
+        """
+        Returnerer en kopi av kommandoen, eller None hvis den er ukjent/utløpt fra historikken.
+        """
+        with self._cond:
+            command = self._commands.get(command_id)
+            return dict(command) if command else None
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                **self.stats,
+                "pending_events": len(self._events),
+                "pulse_counts": dict(self.pulse_counts),
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and (not self._events or self._events[0][0] > time.monotonic()):
+                    timeout = self._events[0][0] - time.monotonic() if self._events else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+
+                # Hent alle hendelser som har forfalt
+                now = time.monotonic()
+                due = []
+                while self._events and self._events[0][0] <= now:
+                    due.append(heapq.heappop(self._events))
+
+            # Skriv til pinnene uten å holde låsen (pigpio-kall går over socket)
+            for deadline, _, action, command_id, port, pin in due:
+                self._execute(action, command_id, port, pin, deadline)
+
+    def _execute(self, action, command_id, port, pin, deadline):
+        # Pin og port ligger i selve hendelsen, slik at "off" alltid utføres
+        # selv om kommandoen er skjøvet ut av historikken.
+        level = self.active_state if action == "on" else 1 - self.active_state
+        try:
+            self.pi.write(pin, level)
+        except Exception as e:
+            with self._cond:
+                command = self._commands.get(command_id)
+                if command:
+                    command["state"] = "failed"
+                    command["error"] = str(e)
+                self.stats["failed"] += 1
+            logger.error(f"Feil ved puls til {port} (GPIO {pin}): {e}")
+            return
+
+        now = time.monotonic()
+        lateness_ms = (now - deadline) * 1000.0
+        with self._cond:
+            self.stats["max_lateness_ms"] = max(self.stats["max_lateness_ms"], round(lateness_ms, 3))
+            command = self._commands.get(command_id) or {}
+            if action == "on":
+                command["state"] = "active"
+                command["started_at"] = now
+            else:
+                command["finished_at"] = now
+                if command.get("state") != "failed":
+                    command["state"] = "done"
+                    self.stats["completed"] += 1
+                    self.pulse_counts[port] = self.pulse_counts.get(port, 0) + 1
+
+        logger.debug(f"Puls {action} for {port} (GPIO {pin}), kommando {command_id}")
@@ -0,0 +1,277 @@
+# utils/request_metrics.py
+
+"""
+Måling av responstid per rute og blueprint.
+
+WSGI-middleware rundt app.wsgi_app måler tiden fra forespørselen kommer inn til
+responsen er ferdig sendt (ClosingIterator), og teller statuskoder og pågående kall.
+Ruten merkes i environ av en before_request-hook, slik at målingene grupperes på
+URL-regel ("/port/<port>/open") og ikke på konkrete URL-er.
+
+SSE-strømmer (Content-Type text/event-stream) varer så lenge klienten er tilkoblet. For dem
+måles responstiden frem til start_response, og de telles som åpne strømmer (streams_open)
+i stedet for pågående forespørsler.
+
+Responstider lagres i histogrammer med logaritmiske bøtter (HDR-stil: 16 under-bøtter
+per toerpotens av mikrosekunder, ~6 % oppløsning) – fast minnebruk uansett antall kall.
+I tillegg til totalen siden oppstart holdes en ring av korte intervaller som gir et
+glidende vindu (standard siste 5 minutter).
+"""
+
+import threading
+import time
+
+from flask import request
+from werkzeug.wsgi import ClosingIterator
+
+from utils.metrics import get_registry
+
+WINDOW_SEC = 300
+WINDOW_SLOTS = 10
+SUB_BUCKETS = 16
+
+ROUTE_KEY = "garage.route"
+BLUEPRINT_KEY = "garage.blueprint"
+UNMATCHED = "<unmatched>"
+
+
+def _bucket_index(us):
+    if us < SUB_BUCKETS:
+        return us
+    shift = us.bit_length() - 5
+    return (shift + 1) * SUB_BUCKETS + (us >> shift) - SUB_BUCKETS
+
+
+def _bucket_bounds(index):
+    if index < SUB_BUCKETS:
+        return index, index + 1
+    shift = index // SUB_BUCKETS - 1
+    mantissa = index % SUB_BUCKETS + SUB_BUCKETS
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+class LatencyHistogram:
+    __slots__ = ("counts", "count", "total_us", "max_us")
+
+    def __init__(self):
+        self.counts = {}        # bøtteindeks -> antall
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def record(self, us):
+        index = _bucket_index(us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total_us += other.total_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, pct):
+        """
+        Returnerer estimert persentil i millisekunder (midt i bøtta).
+        """
+        if not self.count:
+            return None
+        target = max(1, round(self.count * pct / 100.0))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                low, high = _bucket_bounds(index)
+                return round(min((low + high) / 2.0, self.max_us) / 1000.0, 3)
+        return round(self.max_us / 1000.0, 3)
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_us / self.count / 1000.0, 3),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_us / 1000.0, 3),
+        }
+
+
+class RequestMetrics:
+    def __init__(self, window_sec=WINDOW_SEC, window_slots=WINDOW_SLOTS):
+        self.window_sec = window_sec
+        self.slot_sec = window_sec / window_slots
+        self.window_slots = window_slots
+        self._lock = threading.Lock()
+        self._routes = {}           # route -> {"blueprint", "total", "status"}
+        self._blueprints = {}       # blueprint -> LatencyHistogram
+        self._slots = []            # [(slot_id, {route: LatencyHistogram})], nyeste sist
+        self.in_flight = 0
+        self.streams_open = 0
+        self.started_at = time.time()
+
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def stream_opened(self):
+        with self._lock:
+            self.streams_open += 1
+
+    def stream_closed(self):
+        with self._lock:
+            self.streams_open -= 1
+
+    def end(self, environ, status_code, started):
+        us = int((time.perf_counter() - started) * 1_000_000)
+        route = environ.get(ROUTE_KEY, UNMATCHED)
+        blueprint = environ.get(BLUEPRINT_KEY) or "-"
+        slot_id = int(time.time() // self.slot_sec)
+
+        with self._lock:
+            self.in_flight -= 1
+            entry = self._routes.get(route)
+            if entry is None:
+                entry = {"blueprint": blueprint, "total": LatencyHistogram(), "status": {}}
+                self._routes[route] = entry
+            entry["total"].record(us)
+            entry["status"][status_code] = entry["status"].get(status_code, 0) + 1
+
+            histogram = self._blueprints.get(blueprint)
+            if histogram is None:
+                histogram = self._blueprints[blueprint] = LatencyHistogram()
+            histogram.record(us)
+
+            if not self._slots or self._slots[-1][0] != slot_id:
+                self._slots.append((slot_id, {}))
+                del self._slots[:-self.window_slots]
+            window = self._slots[-1][1]
+            histogram = window.get(route)
+            if histogram is None:
+                histogram = window[route] = LatencyHistogram()
+            histogram.record(us)
+
+    def get_report(self):
+        """
+        Returnerer persentiler per rute (siden oppstart og i glidende vindu) og per blueprint.
+        """
+        oldest_slot = int(time.time() // self.slot_sec) - self.window_slots + 1
+        with self._lock:
+            window = {}
+            for slot_id, histograms in self._slots:
+                if slot_id < oldest_slot:
+                    continue
+                for route, histogram in histograms.items():
+                    window.setdefault(route, LatencyHistogram()).merge(histogram)
+
+            routes = {
+                route: {
+                    "blueprint": entry["blueprint"],
+                    "since_start": entry["total"].summary(),
+                    "window": window[route].summary() if route in window else {"count": 0},
+                    "status_codes": {str(code): count for code, count in sorted(entry["status"].items())},
+                }
+                for route, entry in sorted(self._routes.items())
+            }
+            blueprints = {name: histogram.summary() for name, histogram in sorted(self._blueprints.items())}
+            in_flight = self.in_flight
+            streams_open = self.streams_open
+
+        return {
+            "in_flight": in_flight,
+            "streams_open": streams_open,
+            "window_sec": self.window_sec,
+            "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started_at)),
+            "routes": routes,
+            "blueprints": blueprints,
+        }
+
+    def collect_metrics(self):
+        with self._lock:
+            requests_total = [
+                ({"route": route, "code": str(code)}, count)
+                for route, entry in self._routes.items() for code, count in entry["status"].items()
+            ]
+            duration_sum = [({"route": route}, entry["total"].total_us / 1_000_000) for route, entry in self._routes.items()]
+            in_flight = self.in_flight
+            streams_open = self.streams_open
+        return [
+            ("garage_http_requests_total", "counter", "HTTP-forespørsler per rute og statuskode", requests_total),
+            ("garage_http_request_seconds_total", "counter", "Samlet responstid per rute i sekunder", duration_sum),
+            ("garage_http_requests_in_flight", "gauge", "Forespørsler under behandling", [({}, in_flight)]),
+            ("garage_http_streams_open", "gauge", "Åpne SSE-strømmer", [({}, streams_open)]),
+        ]
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        status = []
+        stream = []
+
+        def _start_response(status_line, headers, exc_info=None):
+            status[:] = [status_line]
+            if not stream and _is_event_stream(headers):
+                # Strømmen kan vare i timer: mål tiden frem til svaret starter
+                stream.append(True)
+                self.metrics.end(environ, int(status_line[:3]), started)
+                self.metrics.stream_opened()
+            return start_response(status_line, headers, exc_info)
+
+        self.metrics.begin()
+        try:
+            app_iter = self.app(environ, _start_response)
+        except Exception:
+            if stream:
+                self.metrics.stream_closed()
+            else:
+                self.metrics.end(environ, 500, started)
+            raise
+
+        def _finish():
+            if stream:
+                self.metrics.stream_closed()
+                return
+            code = int(status[0][:3]) if status else 500
+            self.metrics.end(environ, code, started)
+
+        return ClosingIterator(app_iter, _finish)
+
+
+def _is_event_stream(headers):
+    for key, value in headers:
+        if key.lower() == "content-type":
+            return value.startswith("text/event-stream")
+    return False
+
+
+_request_metrics = RequestMetrics()
+
+
+def get_request_metrics():
+    return _request_metrics
+
+
+def _tag_request():
+    environ = request.environ
+    environ[ROUTE_KEY] = request.url_rule.rule if request.url_rule else UNMATCHED
+    environ[BLUEPRINT_KEY] = request.blueprint
+
+
+def install_request_metrics(app):
+    """
+    Kobler målingen inn i Flask-appen (kalles én gang fra main.py).
+    """
+    app.before_request(_tag_request)
+    app.wsgi_app = RequestMetricsMiddleware(app.wsgi_app, _request_metrics)
+    get_registry().register_collector(_request_metrics.collect_metrics)
+    return _request_metrics
@@ -5,7 +5,7 @@ import subprocess
 import datetime
 import psutil
 
-from utils.config_loader import load_config
+from utils.config_loader import get_config
 from config import config_paths
 
 logger = get_logger("system_monitor", category="system")
@@ -100,7 +100,7 @@ def get_system_status():
 
 
 def check_thresholds_and_log(status_data):
-    config = load_config(config_paths.CONFIG_HEALTH_PATH)
+    config = get_config(config_paths.CONFIG_HEALTH_PATH)
     warnings = []
 
     # CPU temp
@@ -189,7 +189,7 @@ def get_diagnostics(status_data):
     Forventer at status_data er strukturert med grupperte nøkler (f.eks. status_data['cpu']['cpu_temp_c']).
     """
 
-    config = load_config(config_paths.CONFIG_HEALTH_PATH)
+    config = get_config(config_paths.CONFIG_HEALTH_PATH)
     thresholds = config.get("thresholds", {})
 
     diagnostics = []